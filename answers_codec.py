@@ -0,0 +1,295 @@
+"""Codificação das respostas armazenadas na coluna answers.
+
+Versões:
+- 0: JSON (texto) com chaves "0".."n"; formato original, sempre legível
+- 1: binário posicional, alinhado à ordem das perguntas da pesquisa. Um byte de versão e,
+  para cada pergunta: escala_1_5 em 1 byte (0 = sem resposta); multipla_escolha como
+  índice da opção + 1 em 1 byte (0xFF seguido de texto para valores fora das opções);
+  textos como varint (tamanho + 1, 0 = sem resposta) seguido dos bytes UTF-8.
+
+Módulo sem dependência do Streamlit: também é usado pelos processos de exportação.
+"""
+import json
+import struct
+from typing import Callable, Dict, List, Union
+
+import numpy as np
+
+VERSION_BINARY = 1
+OPTION_LITERAL = 0xFF
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data: bytes, pos: int):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def _write_text(out: bytearray, text: str):
+    encoded = text.encode('utf-8')
+    _write_varint(out, len(encoded) + 1)
+    out += encoded
+
+def encode_binary(questions: List[Dict], answers: Dict) -> bytes:
+    """Versão 1; levanta ValueError se as respostas não couberem no formato posicional"""
+    if not set(answers) <= set(map(str, range(len(questions)))):
+        raise ValueError("resposta para pergunta inexistente")
+    
+    out = bytearray([VERSION_BINARY])
+    for i, q in enumerate(questions):
+        answer = answers.get(str(i))
+        if q['type'] == 'escala_1_5':
+            if answer is None:
+                out.append(0)
+            elif type(answer) is int and 1 <= answer <= 5:
+                out.append(answer)
+            else:
+                raise ValueError(f"escala inválida: {answer!r}")
+        elif q['type'] == 'multipla_escolha':
+            options = q.get('options', [])
+            if answer is None:
+                out.append(0)
+            elif answer in options[:OPTION_LITERAL - 1]:
+                out.append(options.index(answer) + 1)
+            elif isinstance(answer, str):
+                out.append(OPTION_LITERAL)
+                _write_text(out, answer)
+            else:
+                raise ValueError(f"opção inválida: {answer!r}")
+        else:
+            if answer is None:
+                out.append(0)
+            elif isinstance(answer, str):
+                _write_text(out, answer)
+            else:
+                raise ValueError(f"texto inválido: {answer!r}")
+    return bytes(out)
+
+def decode_binary(questions: List[Dict], data: bytes) -> Dict:
+    answers = {}
+    pos = 1
+    for i, q in enumerate(questions):
+        if q['type'] == 'escala_1_5':
+            value = data[pos]
+            pos += 1
+            if value:
+                answers[str(i)] = value
+        elif q['type'] == 'multipla_escolha':
+            value = data[pos]
+            pos += 1
+            if value == OPTION_LITERAL:
+                length, pos = _read_varint(data, pos)
+                answers[str(i)] = data[pos:pos + length - 1].decode('utf-8')
+                pos += length - 1
+            elif value:
+                answers[str(i)] = q['options'][value - 1]
+        else:
+            length, pos = _read_varint(data, pos)
+            if length:
+                answers[str(i)] = data[pos:pos + length - 1].decode('utf-8')
+                pos += length - 1
+    return answers
+
+DECODERS = {
+    VERSION_BINARY: decode_binary,
+}
+
+def encode_answers(questions: List[Dict], answers: Dict) -> bytes:
+    """Codifica na versão binária; respostas fora do esquema ficam em JSON (versão 0)"""
+    try:
+        return encode_binary(questions, answers)
+    except ValueError:
+        return json.dumps(answers).encode('utf-8')
+
+def decode_answers(questions: List[Dict], value: Union[str, bytes]) -> Dict:
+    """Decodifica qualquer versão: texto é JSON; em bytes, o primeiro byte indica a versão"""
+    if isinstance(value, str):
+        return json.loads(value)
+    decoder = DECODERS.get(value[0])
+    if decoder is None:
+        # JSON gravado como bytes (fallback de encode_answers) começa com '{'
+        return json.loads(value)
+    return decoder(questions, value)
+
+def decode_many(questions: List[Dict], values: List[Union[str, bytes]]) -> List[Dict]:
+    """Decodifica várias linhas; as em JSON são lidas com um único json.loads"""
+    decoded = [None] * len(values)
+    json_rows = [i for i, value in enumerate(values) if isinstance(value, str)]
+    if json_rows:
+        parsed = json.loads("[" + ",".join(values[i] for i in json_rows) + "]")
+        for i, answers in zip(json_rows, parsed):
+            decoded[i] = answers
+    for i, value in enumerate(values):
+        if decoded[i] is None:
+            decoded[i] = decode_answers(questions, value)
+    return decoded
+
+SCALE_CELLS = [''] + list(range(1, 256))  # byte da escala -> célula
+
+def row_decoder(questions: List[Dict]) -> Callable[[Union[str, bytes]], List]:
+    """Decodificador de linhas inteiras em células na ordem das perguntas ('' = sem resposta),
+    montado uma vez por pesquisa (para exportações).
+
+    Perguntas de largura fixa seguidas (escala e opção) saem de um único struct.unpack_from e de
+    tabelas byte -> célula; textos são lidos um a um. Linhas em JSON e opções fora da lista
+    (texto literal) usam decode_answers.
+    """
+    keys = [str(i) for i in range(len(questions))]
+    steps = []  # (struct, tabelas) para um trecho de largura fixa; None para um texto
+    tables = []
+    for q in questions:
+        if q['type'] == 'escala_1_5':
+            tables.append(SCALE_CELLS)
+        elif q['type'] == 'multipla_escolha':
+            options = list(q.get('options', []))[:OPTION_LITERAL - 1]
+            tables.append([''] + options + [None] * (255 - len(options)))  # None: texto literal
+        else:
+            if tables:
+                steps.append((struct.Struct(f"{len(tables)}B"), tables))
+                tables = []
+            steps.append(None)
+    if tables:
+        steps.append((struct.Struct(f"{len(tables)}B"), tables))
+
+    def generic(value):
+        answers = decode_answers(questions, value)
+        return [answers.get(key, '') for key in keys]
+
+    def decode(value: Union[str, bytes]) -> List:
+        if isinstance(value, str) or value[0] != VERSION_BINARY:
+            return generic(value)
+        cells = []
+        pos = 1
+        for step in steps:
+            if step is None:
+                length = value[pos]
+                if length < 0x80:
+                    pos += 1
+                else:
+                    length, pos = _read_varint(value, pos)
+                if length:
+                    cells.append(value[pos:pos + length - 1].decode('utf-8'))
+                    pos += length - 1
+                else:
+                    cells.append('')
+            else:
+                unpack, step_tables = step
+                values = [table[byte] for table, byte in zip(step_tables, unpack.unpack_from(value, pos))]
+                if None in values:
+                    return generic(value)
+                cells += values
+                pos += unpack.size
+        return cells
+    
+    return decode
+
+def _read_varints(buf: np.ndarray, pos: np.ndarray):
+    """Lê um varint em cada posição de pos, todas de uma vez; retorna (valores, posições seguintes)"""
+    value = buf[pos].astype(np.int64)
+    pos = pos + 1
+    rows = np.flatnonzero(value >= 0x80)
+    value[rows] &= 0x7F
+    shift = 7
+    while rows.size:
+        byte = buf[pos[rows]]
+        value[rows] |= (byte & 0x7F).astype(np.int64) << shift
+        pos[rows] += 1
+        rows = rows[byte >= 0x80]
+        shift += 7
+    return value, pos
+
+def decode_columns(questions: List[Dict], values: List[Union[str, bytes]], labels: Dict[int, List[str]]) -> List[np.ndarray]:
+    """Decodifica várias linhas pergunta a pergunta, em colunas numpy (para relatórios).
+
+    - escala_1_5: uint8 como no blob, 0 = sem resposta
+    - multipla_escolha: int32, 0 = sem resposta, k = labels[i][k - 1]; labels[i] começa com as
+      opções e recebe os valores fora delas (o mesmo dict serve para vários lotes)
+    - textos: tamanho em caracteres, -1 = sem resposta (o texto em si não é decodificado)
+
+    As linhas binárias são lidas juntas com np.frombuffer sobre os blobs concatenados;
+    as em JSON, uma a uma.
+    """
+    n = len(values)
+    columns = []
+    for i, q in enumerate(questions):
+        if q['type'] == 'escala_1_5':
+            columns.append(np.zeros(n, np.uint8))
+        elif q['type'] == 'multipla_escolha':
+            labels.setdefault(i, list(q.get('options', [])))
+            columns.append(np.zeros(n, np.int32))
+        else:
+            columns.append(np.full(n, -1, np.int32))
+
+    binary = [j for j, value in enumerate(values) if not isinstance(value, str) and value[0] == VERSION_BINARY]
+    if binary:
+        rows = slice(None) if len(binary) == n else np.array(binary)
+        blobs = [values[j] for j in binary]
+        sizes = np.fromiter(map(len, blobs), np.int64, len(blobs))
+        buf = np.frombuffer(b"".join(blobs) + b"\0", np.uint8)
+        pos = np.cumsum(sizes) - sizes + 1
+        texts = []  # (pergunta, varint, início) de cada pergunta de texto
+        for i, q in enumerate(questions):
+            if q['type'] == 'escala_1_5':
+                columns[i][rows] = buf[pos]
+                pos += 1
+            elif q['type'] == 'multipla_escolha':
+                code = buf[pos].astype(np.int32)
+                pos += 1
+                literal = np.flatnonzero(code == OPTION_LITERAL)
+                if literal.size:
+                    length, start = _read_varints(buf, pos[literal])
+                    for j, first, size in zip(literal, start, length - 1):
+                        code[j] = _label_code(labels[i], bytes(buf[first:first + size]).decode('utf-8'))
+                    pos[literal] = start + length - 1
+                columns[i][rows] = code
+            else:
+                length, pos = _read_varints(buf, pos)
+                texts.append((i, length, pos))
+                pos = pos + np.maximum(length - 1, 0)
+        
+        if texts:
+            # Caracteres = bytes - bytes de continuação UTF-8 (10xxxxxx) de cada trecho. Os trechos,
+            # linha a linha, já estão na ordem do buffer: um único reduceat conta todos
+            starts = np.stack([start for _, _, start in texts], axis=1).ravel()
+            lengths = np.stack([np.maximum(length - 1, 0) for _, length, _ in texts], axis=1).ravel()
+            bounds = np.empty(2 * len(starts), np.int64)
+            bounds[0::2] = starts
+            bounds[1::2] = starts + lengths
+            continuation = np.add.reduceat(((buf >> 6) == 2).view(np.uint8), bounds, dtype=np.int32)[0::2]
+            chars = (lengths - np.where(lengths > 0, continuation, 0)).reshape(len(blobs), len(texts))
+            for k, (i, length, _) in enumerate(texts):
+                columns[i][rows] = np.where(length > 0, chars[:, k], -1)
+
+    others = sorted(set(range(n)) - set(binary))
+    for j, answers in zip(others, decode_many(questions, [values[j] for j in others])):
+        for i, q in enumerate(questions):
+            answer = answers.get(str(i))
+            if answer is None:
+                continue
+            if q['type'] == 'escala_1_5':
+                # JSON antigo: valores fracionários são arredondados; fora de 1..5, ignorados
+                try:
+                    value = round(float(answer))
+                except (TypeError, ValueError, OverflowError):
+                    continue
+                if 1 <= value <= 5:
+                    columns[i][j] = value
+            elif q['type'] == 'multipla_escolha':
+                columns[i][j] = _label_code(labels[i], str(answer))
+            else:
+                columns[i][j] = len(str(answer))
+    return columns
+
+def _label_code(labels: List[str], label: str) -> int:
+    if label not in labels:
+        labels.append(label)
+    return labels.index(label) + 1
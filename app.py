@@ -1,23 +1,33 @@
 import streamlit as st
 import sqlite3
 import pandas as pd
+import numpy as np
 import bcrypt
 import json
 import smtplib
 import time
 import random
-from datetime import datetime
+from datetime import datetime, timezone
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import deque, OrderedDict
 from contextlib import contextmanager
 from typing import Optional, Dict, List, Tuple, Any
 import os
+import sys
 import hashlib
 import io
+import html
+import itertools
+import multiprocessing
+import threading
 from dotenv import load_dotenv
+from csv_export import csv_header, export_range, format_rows
+from answers_codec import encode_answers, decode_answers, decode_columns
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -32,6 +42,43 @@ SECRET_KEY = os.getenv("SECRET_KEY", "default-secret-key-change-in-production")
 DEFAULT_ADMIN_PASS = "admin123"
 MAX_RETRIES = 3
 DB_PATH = "survey.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+PG_POOL_SIZE = int(os.getenv("PG_POOL_SIZE", "10"))  # conexões PostgreSQL por processo
+LIVE_FEED_INTERVAL = 3  # segundos entre atualizações do painel ao vivo
+SEARCH_PAGE_SIZE = 20
+SEARCH_RANK_CANDIDATES = 5000  # termos muito comuns: ranqueia só as respostas mais recentes que casam
+SEARCH_INDEX_VERSION = 1  # gravada em app_state junto com o preenchimento completo de response_text
+LIVE_FEED_RESYNC = 30  # segundos; corrige totais com respostas recebidas por outros workers
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "0"))  # processos para exportação; 0 = sem paralelismo
+EXPORT_CHUNK_SIZE = 50000  # faixa de IDs por bloco de exportação
+REPORT_BATCH_SIZE = 20000  # respostas decodificadas por vez no relatório
+REPORT_CACHE_SURVEYS = 4  # pesquisas com colunas do relatório mantidas em memória
+FAST_SUBMIT = os.getenv("FAST_SUBMIT", "1") == "1"  # envio via log local com gravação assíncrona no banco
+RESPONSE_LOG = os.getenv("RESPONSE_LOG", "responses.log")  # um arquivo por processo
+LOG_FSYNC_INTERVAL = 0.02  # segundos entre fsyncs em grupo
+LOG_REPLAY_INTERVAL = 0.5  # segundos máximos entre reaplicações no banco
+LOG_REPLAY_BATCH_BYTES = 1024 * 1024
+LOG_ROTATE_BYTES = 8 * 1024 * 1024
+MAX_ACTIVE_RESPONDENTS = int(os.getenv("MAX_ACTIVE_RESPONDENTS", "400"))  # por processo; 0 = sem limite
+RESPONDENT_IDLE_TIMEOUT = 600  # segundos sem interação até liberar a vaga de um respondente
+WAITING_ROOM_INTERVAL = 5  # segundos entre consultas da sala de espera
+WAITING_ROOM_TIMEOUT = 30  # segundos sem consulta até sair da fila (aba fechada)
+QUOTA_SYNC_INTERVAL = 2  # segundos entre releituras das cotas (respostas de outros workers)
+PROFILE_INTERVAL = 0.005  # segundos entre amostras de pilha do profiler
+PROFILE_RING_SIZE = 20  # perfis guardados por processo
+
+# Driver PostgreSQL é opcional (necessário apenas com DATABASE_URL)
+try:
+    import psycopg2
+    import psycopg2.pool
+except ImportError:
+    psycopg2 = None
+
+# flock só existe em sistemas POSIX; sem ele, o log local não tem trava de dono único
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 # Pool de conexões SQLite
 class ConnectionPool:
@@ -55,15 +102,1357 @@ class ConnectionPool:
         )
         try:
             yield conn
+        except Exception:
+            conn.rollback()  # a conexão não volta ao pool com uma transação pela metade
+            raise
         finally:
             if len(self.pool) < self.pool_size:
                 self.pool.append(conn)
             else:
                 conn.close()
 
-# Inicializar pool global
-if 'db_pool' not in st.session_state:
-    st.session_state.db_pool = ConnectionPool(DB_PATH)
+# Camada de armazenamento (pesquisas, respostas, rate limits e config admin)
+class BaseStorage:
+    """Operações comuns aos backends; subclasses definem conexão e dialeto SQL"""
+    placeholder = "?"
+    recent_clause = "datetime(timestamp) > datetime('now', '-' || ? || ' seconds')"
+    older_clause = "datetime(timestamp) < datetime('now', '-' || ? || ' seconds')"
+    age_minutes_expr = "(strftime('%s', 'now') - strftime('%s', timestamp)) / 60"
+    schema: List[str] = []
+    # Colunas adicionadas depois da criação original das tabelas: (tabela, coluna, tipo)
+    migrations = [
+        ('surveys', 'opens_at', 'TIMESTAMP'),
+        ('surveys', 'closes_at', 'TIMESTAMP'),
+        ('surveys', 'max_responses', 'INTEGER'),
+    ]
+    initialized = False
+
+    def get_connection(self):
+        raise NotImplementedError
+
+    def pool_status(self) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    def _sql(self, query: str) -> str:
+        return query.replace("?", self.placeholder)
+
+    def data_version(self) -> Optional[int]:
+        """Indicador barato de que algo mudou no banco; None se o backend não tem (write_seq é sempre lido)"""
+        return None
+
+    def encode_answers(self, questions: List[Dict], answers: Dict):
+        """Valor gravado na coluna answers (JSON; backends com coluna binária usam answers_codec)"""
+        return json.dumps(answers)
+
+    def _table_exists(self, c, table: str) -> bool:
+        raise NotImplementedError
+
+    def _column_exists(self, c, table: str, column: str) -> bool:
+        raise NotImplementedError
+
+    def _search_index_outdated(self, c) -> bool:
+        """True se response_text existe num formato antigo (é recriada e preenchida de novo)"""
+        return False
+
+    def init_schema(self, default_password_hash):
+        """Cria as tabelas e a senha admin padrão (hash gerado sob demanda); uma vez por instância"""
+        if self.initialized:
+            return
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            if self._table_exists(c, 'response_text') and self._search_index_outdated(c):
+                c.execute("DROP TABLE response_text")
+            if not self._table_exists(c, 'response_text') and self._table_exists(c, 'app_state'):
+                # Índice a criar: a marca de um índice anterior deixa de valer antes da criação
+                c.execute(self._sql("DELETE FROM app_state WHERE key = ?"), ('search_index_version',))
+                conn.commit()
+            for statement in self.schema:
+                c.execute(statement)
+            for table, column, column_type in self.migrations:
+                if not self._column_exists(c, table, column):
+                    c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+            c.execute(self._sql("SELECT value FROM app_state WHERE key = ?"), ('search_index_version',))
+            indexed = c.fetchone()
+            if not indexed or indexed[0] != SEARCH_INDEX_VERSION:
+                # Índice novo ou preenchimento interrompido (no SQLite, a criação da tabela não volta
+                # atrás com o rollback): refeito do zero, com a marca gravada na mesma transação
+                c.execute("DELETE FROM response_text")
+                self._backfill_search_index(c)
+                self._set_state(c, 'search_index_version', SEARCH_INDEX_VERSION)
+
+            c.execute("SELECT COUNT(*) FROM admin_config")
+            if c.fetchone()[0] == 0:
+                c.execute(self._sql("""
+                    INSERT INTO admin_config (id, password_hash) VALUES (1, ?)
+                    ON CONFLICT (id) DO NOTHING
+                """), (default_password_hash(),))
+            conn.commit()
+        self.initialized = True
+
+    def check_rate_limit(self, session_id: str, action: str, max_requests: int, window_seconds: int) -> Optional[int]:
+        """Registra a tentativa; retorna o write_seq da inserção ou None se o limite foi atingido"""
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(self._sql(f"""
+                SELECT COUNT(*) FROM rate_limits
+                WHERE session_id = ? AND action = ? AND {self.recent_clause}
+            """), (session_id, action, window_seconds))
+            if c.fetchone()[0] >= max_requests:
+                return None
+
+            c.execute(self._sql("INSERT INTO rate_limits (session_id, action) VALUES (?, ?)"),
+                     (session_id, action))
+            seq = self._bump_write_seq(c)
+            conn.commit()
+            return seq
+
+    def get_admin_credentials(self) -> Optional[Tuple[str, bool]]:
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT password_hash, is_default_pass FROM admin_config LIMIT 1")
+            result = c.fetchone()
+        return (result[0], bool(result[1])) if result else None
+
+    def update_admin_password(self, password_hash: str):
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(self._sql("UPDATE admin_config SET password_hash = ?, is_default_pass = ?"),
+                     (password_hash, False))
+            conn.commit()
+
+    def get_active_survey(self) -> Optional[Tuple]:
+        """Retorna (id, título, perguntas, abre em, fecha em, máximo de respostas)"""
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(self._sql("""
+                SELECT id, title, questions, opens_at, closes_at, max_responses
+                FROM surveys WHERE is_active = ? ORDER BY id DESC LIMIT 1
+            """), (True,))
+            return c.fetchone()
+
+    def get_state(self, key: str) -> Optional[int]:
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(self._sql("SELECT value FROM app_state WHERE key = ?"), (key,))
+            result = c.fetchone()
+        return result[0] if result else None
+
+    def _set_state(self, c, key: str, value: int):
+        c.execute(self._sql("""
+            INSERT INTO app_state (key, value) VALUES (?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value
+        """), (key, value))
+
+    def set_state(self, key: str, value: int):
+        with self.get_connection() as conn:
+            self._set_state(conn.cursor(), key, value)
+            conn.commit()
+
+    def survey_generation(self) -> int:
+        """Contador incrementado a cada criação/encerramento de pesquisa (compartilhado entre processos)"""
+        return self.get_state('survey_generation') or 0
+
+    def _bump_survey_generation(self, c):
+        c.execute("""
+            INSERT INTO app_state (key, value) VALUES ('survey_generation', 1)
+            ON CONFLICT (key) DO UPDATE SET value = app_state.value + 1
+        """)
+
+    def write_seq(self) -> int:
+        """Contador incrementado por toda escrita que altera contagens (em qualquer processo)"""
+        return self.get_state('write_seq') or 0
+
+    def _bump_write_seq(self, c) -> int:
+        """Incrementa write_seq na transação da escrita e retorna o novo valor"""
+        c.execute("""
+            INSERT INTO app_state (key, value) VALUES ('write_seq', 1)
+            ON CONFLICT (key) DO UPDATE SET value = app_state.value + 1
+        """)
+        c.execute("SELECT value FROM app_state WHERE key = 'write_seq'")
+        return c.fetchone()[0]
+
+    def get_survey(self, survey_id: int) -> Optional[Tuple[str, str]]:
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(self._sql("SELECT title, questions FROM surveys WHERE id = ?"), (survey_id,))
+            return c.fetchone()
+
+    def list_surveys(self) -> List[Tuple[int, str, Any]]:
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT id, title, created_at FROM surveys ORDER BY id DESC")
+            return c.fetchall()
+
+    def create_survey(self, title: str, questions_json: str, opens_at: Optional[str] = None,
+                      closes_at: Optional[str] = None, max_responses: Optional[int] = None) -> int:
+        """Desativa pesquisas anteriores e cria a nova na mesma transação; retorna o write_seq"""
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(self._sql("UPDATE surveys SET is_active = ?, closed_at = CURRENT_TIMESTAMP WHERE is_active = ?"),
+                     (False, True))
+            c.execute(self._sql("""
+                INSERT INTO surveys (title, questions, opens_at, closes_at, max_responses)
+                VALUES (?, ?, ?, ?, ?)
+            """), (title, questions_json, opens_at, closes_at, max_responses))
+            self._bump_survey_generation(c)
+            seq = self._bump_write_seq(c)
+            conn.commit()
+        return seq
+
+    def close_survey(self, survey_id: int):
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(self._sql("""
+                UPDATE surveys
+                SET is_active = ?, closed_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """), (False, survey_id))
+            self._bump_survey_generation(c)
+            conn.commit()
+
+    def _insert_response(self, c, row: Tuple) -> int:
+        """row = (survey_id, answers, is_anonymous, nome, email, sessão, submitted_at ou None)"""
+        c.execute(self._sql("""
+            INSERT INTO responses (survey_id, answers, is_anonymous, respondent_name,
+                                 respondent_email, ip_address, submitted_at)
+            VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        """), row)
+        return c.lastrowid
+
+    def _index_texts(self, c, response_id: int, survey_id: int, texts: List[Tuple[int, str]]):
+        """Adiciona respostas de texto ao índice de busca (mesma transação da resposta)"""
+        if texts:
+            c.executemany(self._sql("INSERT INTO response_text (answer, response_id, survey_id, question) VALUES (?, ?, ?, ?)"),
+                         [(text, response_id, survey_id, question) for question, text in texts])
+
+    def _backfill_search_index(self, c):
+        """Indexa as respostas de texto já existentes (executado uma vez, ao criar o índice)"""
+        c.execute("SELECT id, questions FROM surveys")
+        for survey_id, questions_json in c.fetchall():
+            questions = json.loads(questions_json)
+            c.execute(self._sql("SELECT id, answers FROM responses WHERE survey_id = ?"), (survey_id,))
+            for response_id, answers in c.fetchall():
+                self._index_texts(c, response_id, survey_id, text_answers(questions, decode_answers(questions, answers)))
+
+    def save_response(self, survey_id: int, answers_value, is_anonymous: bool,
+                      name: Optional[str], email: Optional[str], session_id: str,
+                      texts: List[Tuple[int, str]] = ()) -> int:
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            response_id = self._insert_response(c, (survey_id, answers_value, is_anonymous, name, email, session_id, None))
+            self._index_texts(c, response_id, survey_id, texts)
+            seq = self._bump_write_seq(c)
+            conn.commit()
+        return seq
+
+    def save_responses_bulk(self, rows: List[Tuple], state: Optional[Tuple[str, int]] = None) -> Optional[int]:
+        """Grava várias respostas de uma vez; retorna o write_seq (None se não havia linhas).
+
+        Cada linha é (survey_id, answers, is_anonymous, nome, email, sessão, submitted_at, textos);
+        state (chave, valor) é gravado em app_state na mesma transação.
+        """
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            for row in rows:
+                response_id = self._insert_response(c, row[:7])
+                self._index_texts(c, response_id, row[0], row[7])
+            seq = self._bump_write_seq(c) if rows else None
+            if state:
+                self._set_state(c, *state)
+            conn.commit()
+        return seq
+
+    def _stream(self, sql: str, params: Tuple):
+        """Itera o resultado de uma consulta sem carregar tudo em memória"""
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(self._sql(sql), params)
+            yield from c
+
+    def iter_responses(self, survey_id: int):
+        """Itera (id, submitted_at, answers, is_anonymous, nome, email) em ordem de ID"""
+        return self._stream("""
+            SELECT id, submitted_at, answers, is_anonymous, respondent_name, respondent_email
+            FROM responses WHERE survey_id = ?
+            ORDER BY id
+        """, (survey_id,))
+
+    def iter_report_rows(self, survey_id: int, after_id: int):
+        """Itera (total da pesquisa, id, submitted_at, is_anonymous, answers) com id > after_id.
+
+        O total vem na mesma consulta (mesmo snapshot) e há sempre ao menos uma linha (id None
+        se não há respostas novas): um cache incremental percebe uma resposta de ID menor
+        confirmada depois da última leitura (possível no PostgreSQL) e relê tudo.
+        """
+        return self._stream("""
+            SELECT counted.total, r.id, r.submitted_at, r.is_anonymous, r.answers
+            FROM (SELECT COUNT(*) AS total FROM responses WHERE survey_id = ?) counted
+            LEFT JOIN responses r ON r.survey_id = ? AND r.id > ?
+            ORDER BY r.id
+        """, (survey_id, survey_id, after_id))
+
+    def response_id_range(self, survey_id: int) -> Tuple[Optional[int], Optional[int]]:
+        """Menor e maior ID de resposta da pesquisa (para dividir a exportação em blocos)"""
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(self._sql("SELECT MIN(id), MAX(id) FROM responses WHERE survey_id = ?"), (survey_id,))
+            return c.fetchone()
+
+    def export_source(self) -> Tuple[str, str]:
+        """(tipo, caminho ou DSN): os processos da exportação abrem as próprias conexões com isso"""
+        raise NotImplementedError
+
+    # As contagens abaixo trazem o write_seq lido na mesma consulta (mesmo snapshot)
+    write_seq_expr = "COALESCE((SELECT value FROM app_state WHERE key = 'write_seq'), 0)"
+
+    def survey_counts(self, survey_id: int) -> Tuple[int, int, int]:
+        """Retorna (total, anônimas, write_seq) de uma pesquisa em uma única consulta"""
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(self._sql(f"""
+                SELECT COUNT(*), COALESCE(SUM(CASE WHEN is_anonymous THEN 1 ELSE 0 END), 0),
+                       {self.write_seq_expr}
+                FROM responses WHERE survey_id = ?
+            """), (survey_id,))
+            total, anonymous, seq = c.fetchone()
+        return int(total), int(anonymous), seq
+
+    def get_totals(self) -> Tuple[int, int, int]:
+        """Retorna (total de pesquisas, total de respostas, write_seq)"""
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(f"""
+                SELECT (SELECT COUNT(*) FROM surveys), (SELECT COUNT(*) FROM responses), {self.write_seq_expr}
+            """)
+            return tuple(c.fetchone())
+
+    def rate_limit_ages(self, window_seconds: int) -> Tuple[int, List[Tuple[int, int]]]:
+        """Retorna (write_seq, [(idade em minutos, quantidade)]) dos rate limits dentro da janela"""
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(self._sql(f"""
+                SELECT {self.write_seq_expr}, ages.age, ages.n
+                FROM (SELECT 1 AS one) base
+                LEFT JOIN (
+                    SELECT {self.age_minutes_expr} AS age, COUNT(*) AS n FROM rate_limits
+                    WHERE {self.recent_clause}
+                    GROUP BY 1
+                ) ages ON 1 = 1
+            """), (window_seconds,))
+            rows = c.fetchall()
+        return rows[0][0], [(int(age), n) for _, age, n in rows if age is not None]
+
+    def search_answers(self, survey_id: int, query: str, limit: int, offset: int) -> Tuple[int, List[Tuple[int, int, str]]]:
+        """Busca nas respostas de texto: (total, [(response_id, pergunta, trecho)]) ordenado por relevância.
+
+        Os trechos marcam os termos encontrados com \\x02 ... \\x03. Só as SEARCH_RANK_CANDIDATES
+        respostas mais recentes que casam são paginadas; o total conta todas.
+        """
+        raise NotImplementedError
+
+    def purge_rate_limits(self, older_than_seconds: int) -> int:
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(self._sql(f"DELETE FROM rate_limits WHERE {self.older_clause}"), (older_than_seconds,))
+            deleted = c.rowcount
+            conn.commit()
+        return deleted
+
+class SQLiteStorage(BaseStorage):
+    """Backend padrão: arquivo SQLite local (um único nó)"""
+    schema = [
+        '''CREATE TABLE IF NOT EXISTS admin_config
+           (id INTEGER PRIMARY KEY,
+            password_hash TEXT NOT NULL,
+            is_default_pass BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS surveys
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            questions TEXT NOT NULL,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            closed_at TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS responses
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            survey_id INTEGER NOT NULL,
+            answers TEXT NOT NULL,
+            is_anonymous BOOLEAN DEFAULT 1,
+            respondent_name TEXT,
+            respondent_email TEXT,
+            ip_address TEXT,
+            submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (survey_id) REFERENCES surveys (id))''',
+        '''CREATE INDEX IF NOT EXISTS idx_responses_survey ON responses (survey_id)''',
+        '''CREATE TABLE IF NOT EXISTS app_state
+           (key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL)''',
+        '''CREATE TABLE IF NOT EXISTS rate_limits
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            action TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        # rowid = pesquisa << 40 | resposta << 10 | pergunta: a busca de uma pesquisa é uma faixa de rowid
+        # resolvida dentro do índice (sem casar e ranquear as respostas das outras pesquisas)
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS response_text USING fts5
+           (answer,
+            tokenize = 'unicode61 remove_diacritics 2')''',
+    ]
+
+    def __init__(self, db_path: str, pool_size: int = 5):
+        self.pool = ConnectionPool(db_path, pool_size)
+        self._version_conn = None
+        self._version_lock = threading.Lock()  # só para a conexão de data_version
+
+    def get_connection(self):
+        return self.pool.get_connection()
+
+    def pool_status(self) -> Tuple[int, int]:
+        return len(self.pool.pool), self.pool.pool_size
+
+    def export_source(self) -> Tuple[str, str]:
+        return 'sqlite', os.path.abspath(self.pool.db_path)
+
+    def data_version(self) -> int:
+        """PRAGMA data_version muda quando qualquer outra conexão confirma uma escrita"""
+        with self._version_lock:
+            if self._version_conn is None:
+                # Conexão dedicada, nunca usada para escrita
+                self._version_conn = sqlite3.connect(self.pool.db_path, check_same_thread=False, timeout=30)
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def encode_answers(self, questions: List[Dict], answers: Dict) -> bytes:
+        """Formato binário compacto (BLOB); linhas antigas em JSON continuam legíveis"""
+        return encode_answers(questions, answers)
+
+    def _table_exists(self, c, table: str) -> bool:
+        c.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table,))
+        return c.fetchone() is not None
+
+    def _column_exists(self, c, table: str, column: str) -> bool:
+        c.execute(f"PRAGMA table_info({table})")
+        return any(row[1] == column for row in c.fetchall())
+
+    def _search_index_outdated(self, c) -> bool:
+        # Formato anterior: pesquisa, resposta e pergunta em colunas UNINDEXED
+        return self._column_exists(c, 'response_text', 'survey_id')
+
+    def _index_texts(self, c, response_id: int, survey_id: int, texts: List[Tuple[int, str]]):
+        if texts:
+            c.executemany("INSERT INTO response_text (rowid, answer) VALUES (?, ?)",
+                          [(survey_id << 40 | response_id << 10 | question, text) for question, text in texts])
+
+    def search_answers(self, survey_id: int, query: str, limit: int, offset: int) -> Tuple[int, List[Tuple[int, int, str]]]:
+        # Cada termo vira uma frase entre aspas: sintaxe FTS5 digitada pelo usuário não quebra a consulta
+        match = " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+        if not match:
+            return 0, []
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            # Uma consulta: total da pesquisa + página ranqueada entre as SEARCH_RANK_CANDIDATES
+            # respostas mais recentes que casam (bm25 sobre todas custa ~2µs por resposta)
+            c.execute("""
+                SELECT total, hits.* FROM
+                    (SELECT COUNT(*) AS total FROM response_text
+                     WHERE response_text MATCH :match AND rowid BETWEEN :first AND :last)
+                LEFT JOIN
+                    (SELECT rowid, snippet(response_text, 0, char(2), char(3), '…', 16)
+                     FROM response_text
+                     WHERE response_text MATCH :match AND rowid <= :last AND rowid > COALESCE(
+                         (SELECT rowid FROM response_text
+                          WHERE response_text MATCH :match AND rowid BETWEEN :first AND :last
+                          ORDER BY rowid DESC LIMIT 1 OFFSET :candidates), :first - 1)
+                     ORDER BY rank
+                     LIMIT :limit OFFSET :offset) AS hits
+            """, {'match': match, 'first': survey_id << 40, 'last': (survey_id + 1 << 40) - 1,
+                  'candidates': SEARCH_RANK_CANDIDATES, 'limit': limit, 'offset': offset})
+            rows = c.fetchall()
+        return rows[0][0], [(rowid >> 10 & (1 << 30) - 1, rowid & 1023, snippet)
+                            for _, rowid, snippet in rows if rowid is not None]
+
+class PostgresStorage(BaseStorage):
+    """Backend PostgreSQL: permite várias réplicas atrás de um load balancer"""
+    placeholder = "%s"
+    recent_clause = "timestamp > CURRENT_TIMESTAMP - %s * INTERVAL '1 second'"
+    older_clause = "timestamp < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'"
+    age_minutes_expr = "FLOOR(EXTRACT(EPOCH FROM (LOCALTIMESTAMP - timestamp)) / 60)"
+    schema = [
+        '''CREATE TABLE IF NOT EXISTS admin_config
+           (id INTEGER PRIMARY KEY,
+            password_hash TEXT NOT NULL,
+            is_default_pass BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS surveys
+           (id SERIAL PRIMARY KEY,
+            title TEXT NOT NULL,
+            questions TEXT NOT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            closed_at TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS responses
+           (id SERIAL PRIMARY KEY,
+            survey_id INTEGER NOT NULL REFERENCES surveys (id),
+            answers TEXT NOT NULL,
+            is_anonymous BOOLEAN DEFAULT TRUE,
+            respondent_name TEXT,
+            respondent_email TEXT,
+            ip_address TEXT,
+            submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE INDEX IF NOT EXISTS idx_responses_survey ON responses (survey_id)''',
+        '''CREATE TABLE IF NOT EXISTS app_state
+           (key TEXT PRIMARY KEY,
+            value BIGINT NOT NULL)''',
+        '''CREATE TABLE IF NOT EXISTS rate_limits
+           (id SERIAL PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            action TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS response_text
+           (response_id INTEGER NOT NULL REFERENCES responses (id),
+            survey_id INTEGER NOT NULL,
+            question INTEGER NOT NULL,
+            answer TEXT NOT NULL,
+            tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('portuguese', answer)) STORED)''',
+        '''CREATE INDEX IF NOT EXISTS idx_response_text_tsv ON response_text USING GIN (tsv)''',
+    ]
+
+    def __init__(self, dsn: str, pool_size: int = 5):
+        if psycopg2 is None:
+            raise RuntimeError("DATABASE_URL definido, mas psycopg2 não está instalado (pip install psycopg2-binary)")
+        self.dsn = dsn
+        self.pool_size = pool_size
+        # Respostas têm acentos: UTF-8 mesmo em bancos criados com outra codificação
+        self.pool = psycopg2.pool.ThreadedConnectionPool(1, pool_size, dsn, client_encoding='UTF8')
+        # getconn() falha com o pool esgotado; o semáforo faz quem chega depois esperar a vez
+        self.slots = threading.BoundedSemaphore(pool_size)
+
+    @contextmanager
+    def get_connection(self):
+        with self.slots:
+            conn = self.pool.getconn()
+            try:
+                yield conn
+            finally:
+                # Encerra também transações só de leitura: a conexão não volta "idle in transaction"
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+                self.pool.putconn(conn, close=bool(conn.closed))
+
+    def pool_status(self) -> Tuple[int, int]:
+        return self.slots._value, self.pool_size
+
+    def close(self):
+        self.pool.closeall()
+
+    def export_source(self) -> Tuple[str, str]:
+        return 'postgres', self.dsn
+
+    def _table_exists(self, c, table: str) -> bool:
+        c.execute("SELECT to_regclass(%s)", (table,))
+        return c.fetchone()[0] is not None
+
+    def _column_exists(self, c, table: str, column: str) -> bool:
+        c.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = %s AND column_name = %s
+        """, (table, column))
+        return c.fetchone() is not None
+
+    def _insert_response(self, c, row: Tuple) -> int:
+        c.execute("""
+            INSERT INTO responses (survey_id, answers, is_anonymous, respondent_name,
+                                 respondent_email, ip_address, submitted_at)
+            VALUES (%s, %s, %s, %s, %s, %s, COALESCE(%s, CURRENT_TIMESTAMP))
+            RETURNING id
+        """, row)
+        return c.fetchone()[0]
+
+    @staticmethod
+    def _copy_row(values: Tuple) -> str:
+        """Linha CSV para o COPY: NULL sem aspas, textos sempre entre aspas (inclusive o vazio)"""
+        fields = []
+        for value in values:
+            if value is None:
+                fields.append("")
+            elif isinstance(value, str):
+                fields.append('"' + value.replace('"', '""') + '"')
+            else:
+                fields.append(str(value))
+        return ",".join(fields) + "\n"
+
+    def save_responses_bulk(self, rows: List[Tuple], state: Optional[Tuple[str, int]] = None):
+        """Usa COPY em vez de INSERTs individuais (IDs reservados antes na sequence)"""
+        if not rows:
+            if state:
+                self.set_state(*state)
+            return None
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            # CURRENT_TIMESTAMP da transação: o mesmo valor que COALESCE daria em _insert_response
+            c.execute("""
+                SELECT nextval(pg_get_serial_sequence('responses', 'id')), CURRENT_TIMESTAMP::timestamp
+                FROM generate_series(1, %s)
+            """, (len(rows),))
+            ids = c.fetchall()
+
+            responses, texts = io.StringIO(), io.StringIO()
+            for (response_id, now), row in zip(ids, rows):
+                responses.write(self._copy_row((response_id,) + tuple(row[:6]) + (row[6] or now,)))
+                for question, text in row[7]:
+                    texts.write(self._copy_row((response_id, row[0], question, text)))
+            responses.seek(0)
+            texts.seek(0)
+
+            c.copy_expert("""
+                COPY responses (id, survey_id, answers, is_anonymous, respondent_name,
+                                respondent_email, ip_address, submitted_at)
+                FROM STDIN WITH (FORMAT csv)
+            """, responses)
+            c.copy_expert("""
+                COPY response_text (response_id, survey_id, question, answer)
+                FROM STDIN WITH (FORMAT csv)
+            """, texts)
+            seq = self._bump_write_seq(c)
+            if state:
+                self._set_state(c, *state)
+            conn.commit()
+        return seq
+
+    def search_answers(self, survey_id: int, query: str, limit: int, offset: int) -> Tuple[int, List[Tuple[int, int, str]]]:
+        with self.get_connection() as conn:
+            c = conn.cursor()
+            c.execute("""
+                WITH matches AS (
+                    SELECT response_id, question, answer, tsv, q
+                    FROM response_text, websearch_to_tsquery('portuguese', %(query)s) AS q
+                    WHERE survey_id = %(survey_id)s AND tsv @@ q
+                )
+                SELECT total, hits.* FROM (SELECT COUNT(*) AS total FROM matches) counted
+                LEFT JOIN LATERAL (
+                    SELECT response_id, question,
+                           ts_headline('portuguese', answer, q,
+                                       'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxWords=16, MinWords=6')
+                    FROM (SELECT * FROM matches ORDER BY response_id DESC LIMIT %(candidates)s) recent
+                    ORDER BY ts_rank(tsv, q) DESC
+                    LIMIT %(limit)s OFFSET %(offset)s
+                ) hits ON TRUE
+            """, {'query': query, 'survey_id': survey_id, 'candidates': SEARCH_RANK_CANDIDATES,
+                  'limit': limit, 'offset': offset})
+            rows = c.fetchall()
+        return rows[0][0], [row[1:] for row in rows if row[1] is not None]
+
+    def _stream(self, sql: str, params: Tuple):
+        """Cursor no servidor: as linhas chegam em lotes, não todas de uma vez"""
+        with self.get_connection() as conn:
+            c = conn.cursor(name=f"stream_{random.getrandbits(32)}")
+            c.itersize = 2000
+            try:
+                c.execute(self._sql(sql), params)
+                yield from c
+            finally:
+                c.close()
+                conn.commit()
+
+@st.cache_resource
+def get_postgres_storage(dsn: str) -> PostgresStorage:
+    """Pool PostgreSQL compartilhado por todas as sessões do processo"""
+    return PostgresStorage(dsn, PG_POOL_SIZE)
+
+def create_storage() -> BaseStorage:
+    """Seleciona o backend: PostgreSQL se DATABASE_URL estiver definido, senão SQLite"""
+    if DATABASE_URL:
+        return get_postgres_storage(DATABASE_URL)
+    return SQLiteStorage(DB_PATH)
+
+# Inicializar armazenamento
+if 'storage' not in st.session_state:
+    st.session_state.storage = create_storage()
+
+# Cache de contadores do painel admin
+class CountersCache:
+    """Contagens por pesquisa, totais e rate limits recentes, atualizados pelo caminho de escrita.
+
+    Toda escrita contada incrementa write_seq em app_state na mesma transação. Escritas deste
+    processo informam o novo valor a record(), que aplica o delta se ele for exatamente o próximo;
+    qualquer escrita que não passou por record() (outro processo, ou escritas locais fora de ordem)
+    faz o cache ser descartado e relido do banco. data_version evita ler write_seq quando nada mudou.
+    O lock protege só a memória: nenhuma consulta ao banco é feita com ele.
+    """
+    RATE_WINDOW_MINUTES = 60
+
+    def __init__(self, storage: BaseStorage):
+        self.storage = storage
+        self.lock = threading.RLock()
+        self.hint = None  # data_version da última validação
+        self.seq = None  # write_seq refletido pelos valores em cache
+        self.surveys: Dict[int, List[int]] = {}  # survey_id -> [total, anônimas]
+        self.totals: Optional[List[int]] = None  # [pesquisas, respostas]
+        self.rate_buckets: Optional[Dict[int, int]] = None  # minuto -> rate limits
+
+    def _reset(self, seq: Optional[int]):
+        self.surveys.clear()
+        self.totals = None
+        self.rate_buckets = None
+        self.seq = seq
+
+    def _validate(self):
+        """Descarta o cache se o banco recebeu escritas que não passaram por record()"""
+        hint = self.storage.data_version()
+        with self.lock:
+            if hint is not None and hint == self.hint:
+                return
+        seq = self.storage.write_seq()
+        with self.lock:
+            if seq != self.seq:
+                self._reset(seq)
+            self.hint = hint
+
+    def _accept(self, seq: int) -> bool:
+        """Com o lock: um valor lido do banco no write_seq `seq` pode entrar no cache?"""
+        if self.seq is None or seq > self.seq:
+            self._reset(seq)
+        return seq == self.seq
+
+    def record(self, seq: Optional[int], responses: List[Tuple[int, bool]] = (), surveys: int = 0,
+               rate_limits: int = 0):
+        """Aplica uma escrita local já confirmada; seq é o write_seq retornado pela escrita"""
+        if seq is None:
+            return
+        with self.lock:
+            if self.seq is None or seq != self.seq + 1:
+                self._reset(None)
+                return
+            self.seq = seq
+            for survey_id, is_anonymous in responses:
+                if survey_id in self.surveys:
+                    self.surveys[survey_id][0] += 1
+                    self.surveys[survey_id][1] += int(bool(is_anonymous))
+            if self.totals is not None:
+                self.totals[0] += surveys
+                self.totals[1] += len(responses)
+            if rate_limits and self.rate_buckets is not None:
+                minute = int(time.time() // 60)
+                self.rate_buckets[minute] = self.rate_buckets.get(minute, 0) + rate_limits
+
+    def cached_survey_counts(self, survey_id: int) -> Optional[Tuple[int, int]]:
+        """Contagens em cache, sem ir ao banco"""
+        with self.lock:
+            counts = self.surveys.get(survey_id)
+            return tuple(counts) if counts else None
+
+    def survey_counts(self, survey_id: int) -> Tuple[int, int]:
+        """Retorna (total, anônimas) de uma pesquisa"""
+        self._validate()
+        counts = self.cached_survey_counts(survey_id)
+        if counts:
+            return counts
+        total, anonymous, seq = self.storage.survey_counts(survey_id)
+        with self.lock:
+            if self._accept(seq):
+                self.surveys[survey_id] = [total, anonymous]
+        return total, anonymous
+
+    def get_totals(self) -> Tuple[int, int]:
+        """Retorna (total de pesquisas, total de respostas)"""
+        self._validate()
+        with self.lock:
+            if self.totals is not None:
+                return tuple(self.totals)
+        total_surveys, total_responses, seq = self.storage.get_totals()
+        with self.lock:
+            if self._accept(seq):
+                self.totals = [total_surveys, total_responses]
+        return total_surveys, total_responses
+
+    def recent_rate_limits(self) -> int:
+        """Rate limits registrados na última hora (janela em baldes de 1 minuto)"""
+        self._validate()
+        now_minute = int(time.time() // 60)
+        oldest = now_minute - self.RATE_WINDOW_MINUTES
+        with self.lock:
+            buckets = self.rate_buckets
+            if buckets is not None:
+                for minute in [m for m in buckets if m <= oldest]:
+                    del buckets[minute]
+                return sum(buckets.values())
+        seq, ages = self.storage.rate_limit_ages(self.RATE_WINDOW_MINUTES * 60)
+        buckets = {now_minute - age: count for age, count in ages}
+        with self.lock:
+            if self._accept(seq):
+                self.rate_buckets = buckets
+        return sum(count for minute, count in buckets.items() if minute > oldest)
+
+@st.cache_resource
+def get_counters() -> CountersCache:
+    """Cache de contadores compartilhado por todas as sessões do processo"""
+    return CountersCache(create_storage())
+
+# Barramento de eventos em processo
+class ResponseFeed:
+    """Pub/sub de novas respostas: save_response publica, os painéis admin leem só os deltas"""
+
+    def __init__(self, maxlen: int = 1000):
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.events = deque(maxlen=maxlen)  # (seq, survey_id, is_anonymous, answers)
+
+    def publish(self, survey_id: int, is_anonymous: bool, answers: Dict):
+        with self.lock:
+            self.seq += 1
+            self.events.append((self.seq, survey_id, bool(is_anonymous), answers))
+
+    def since(self, seq: int) -> Optional[List[Tuple]]:
+        """Eventos posteriores a seq; None se algum já foi descartado (é preciso ressincronizar)"""
+        with self.lock:
+            if seq == self.seq:
+                return []
+            if not self.events or self.events[0][0] > seq + 1:
+                return None
+            return [event for event in self.events if event[0] > seq]
+
+@st.cache_resource
+def get_feed() -> ResponseFeed:
+    """Assinatura única compartilhada por todas as sessões do processo"""
+    return ResponseFeed()
+
+# Log local de respostas (envio rápido)
+class ResponseLog:
+    """Log append-only das respostas aceitas pelo envio rápido, em segmentos `{path}.{n}`.
+
+    append() grava uma linha JSON e aguarda o próximo fsync em grupo, sem esperar pelo banco.
+    Uma thread reaplica na tabela responses, em lotes, só o que já foi sincronizado e grava a
+    posição reaplicada (segmento, offset) em app_state na mesma transação: após uma queda, o
+    replay recomeça exatamente de onde parou. Passado LOG_ROTATE_BYTES, os envios seguem num
+    segmento novo; o antigo só é apagado depois que o banco registra a passagem para o seguinte.
+    Se a escrita ou o fsync falharem, o log para de aceitar envios e append() levanta OSError.
+    Um único processo (e uma única instância) é dono de cada caminho, via flock em `{path}.lock`;
+    uma segunda instância já nasce desativada, sem ler nem reaplicar os segmentos do dono.
+    """
+
+    SEGMENT_SPAN = 1 << 40  # posição gravada = segmento * SEGMENT_SPAN + offset
+
+    def __init__(self, path: str, storage: BaseStorage, counters: CountersCache, feed: ResponseFeed):
+        self.path = path
+        self.storage = storage
+        self.counters = counters
+        self.feed = feed
+        self.questions: Dict[int, List[Dict]] = {}
+        self.state_key = f"response_log_offset:{path}"
+        self.cond = threading.Condition()
+        self.written = 0
+        self.durable = 0
+        self.error: Optional[OSError] = None
+        self.pending: Dict[int, int] = {}  # survey_id -> respostas aceitas ainda não reaplicadas
+        self.replay_generation = 0  # ímpar enquanto um lote passa do log para o banco
+        self.replay_wakeup = threading.Event()
+
+        self.lock_file = self._acquire(path)
+        if self.lock_file is None:
+            # Outro processo (ou uma instância anterior deste) já usa o log: envios vão direto ao banco
+            self.error = OSError(f"{path} em uso por outro processo")
+            self.segment = self.offset = 0
+            self.write_segment = -1  # nenhum segmento aberto
+            return
+
+        # Recuperação, antes de aceitar novos envios
+        if os.path.exists(path) and not self._segments():
+            # Arquivo único de versões anteriores: o offset gravado vale para o segmento 0
+            os.rename(path, self._segment_path(0))
+        self.segment, self.offset = divmod(storage.get_state(self.state_key) or 0, self.SEGMENT_SPAN)
+        for n in self._segments():
+            if n < self.segment:
+                os.remove(self._segment_path(n))  # queda entre registrar o segmento seguinte e apagar este
+        self.write_segment = max(self._segments(), default=self.segment)
+        self._truncate_torn_tail(self._segment_path(self.write_segment))
+        self.file = open(self._segment_path(self.write_segment), 'a+b', buffering=0)
+        os.fsync(self.file.fileno())
+        self.size = os.path.getsize(self._segment_path(self.write_segment))
+        self.durable_position = (self.write_segment, self.size)  # até onde o replay pode ler
+        if self.segment == self.write_segment and self.offset > self.size:
+            # Arquivo do log apagado ou substituído fora do app
+            self.offset = 0
+        self._count_pending()
+
+        threading.Thread(target=self._fsync_loop, daemon=True).start()
+        threading.Thread(target=self._replay_loop, daemon=True).start()
+
+    @staticmethod
+    def _acquire(path: str):
+        """Trava exclusiva do log; None se outra instância já a tem"""
+        lock_file = open(f"{path}.lock", 'a+b')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return None
+        return lock_file
+
+    def _segment_path(self, segment: int) -> str:
+        return f"{self.path}.{segment}"
+
+    def _segments(self) -> List[int]:
+        prefix = os.path.basename(self.path) + "."
+        names = os.listdir(os.path.dirname(self.path) or ".")
+        return sorted(int(name[len(prefix):]) for name in names
+                      if name.startswith(prefix) and name[len(prefix):].isdigit())
+
+    @staticmethod
+    def _truncate_torn_tail(path: str):
+        """Remove uma última linha incompleta (escrita interrompida por uma queda)"""
+        if not os.path.exists(path):
+            return
+        size = os.path.getsize(path)
+        if not size:
+            return
+        with open(path, 'rb') as f:
+            f.seek(max(0, size - 65536))
+            tail = f.read()
+        keep = size - len(tail) + tail.rfind(b"\n") + 1
+        if keep != size:
+            os.truncate(path, keep)
+
+    def _count_pending(self):
+        """Respostas de uma execução anterior que ainda não chegaram ao banco (contam para as cotas)"""
+        for segment in range(self.segment, self.write_segment + 1):
+            if not os.path.exists(self._segment_path(segment)):
+                continue
+            with open(self._segment_path(segment), 'rb') as f:
+                f.seek(self.offset if segment == self.segment else 0)
+                for line in f:
+                    try:
+                        survey_id = json.loads(line)['survey_id']
+                    except ValueError:
+                        continue
+                    self.pending[survey_id] = self.pending.get(survey_id, 0) + 1
+
+    def append(self, entry: Dict):
+        """Grava a resposta e retorna após o fsync; OSError se o log não puder garanti-la"""
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8')
+        survey_id = entry['survey_id']
+        with self.cond:
+            if self.error:
+                raise OSError(f"log de envio rápido desativado: {self.error}")
+            try:
+                if self.file.write(line) != len(line):
+                    raise OSError("escrita incompleta no log de envio rápido")
+            except OSError as e:
+                self._fail(e)
+                raise
+            self.size += len(line)
+            self.written += 1
+            self.pending[survey_id] = self.pending.get(survey_id, 0) + 1
+            ticket = self.written
+            while self.durable < ticket and not self.error:
+                self.cond.wait()
+            if self.durable < ticket:
+                self.pending[survey_id] -= 1
+                raise OSError(f"log de envio rápido desativado: {self.error}")
+
+    def _fail(self, error: OSError):
+        """Desativa o log (chamado sob cond) e acorda quem espera pelo fsync"""
+        if not self.error:
+            self.error = error
+            # Linhas sem fsync voltam para o banco pelo fallback de quem chamou: descartá-las
+            # evita que sejam reaplicadas em dobro após um reinício
+            segment, size = self.durable_position
+            self._discard_after(self.file, size if segment == self.write_segment else 0)
+        self.cond.notify_all()
+
+    @staticmethod
+    def _discard_after(file, size: int):
+        try:
+            os.ftruncate(file.fileno(), size)
+        except OSError:
+            pass
+
+    def replay_snapshot(self, survey_id: int) -> Tuple[int, int]:
+        """Retorna (geração, pendentes) fora de um lote em andamento. Uma contagem do banco lida entre
+        duas chamadas com a mesma geração soma com as pendentes sem perder nem repetir respostas"""
+        with self.cond:
+            while self.replay_generation % 2:
+                self.cond.wait()
+            return self.replay_generation, self.pending.get(survey_id, 0)
+
+    def pending_bytes(self) -> int:
+        """Bytes do log ainda não reaplicados no banco (somando os segmentos)"""
+        total = 0
+        for segment in range(self.segment, self.write_segment + 1):
+            try:
+                total += os.path.getsize(self._segment_path(segment))
+            except FileNotFoundError:
+                pass  # apagado pelo replay durante a soma
+        return max(0, total - self.offset)
+
+    def _fsync_loop(self):
+        next_file = None
+        while not self.error:
+            time.sleep(LOG_FSYNC_INTERVAL)
+            if next_file is None and self.size >= LOG_ROTATE_BYTES:
+                next_file = self._open_next_segment()
+            with self.cond:
+                if self.written == self.durable:
+                    continue
+                target, file, position = self.written, self.file, (self.write_segment, self.size)
+                if next_file is not None:
+                    # Troca no ponto do fsync: o segmento antigo termina exatamente em `target` e,
+                    # sincronizado, pode ser reaplicado e apagado sem esperar novos envios
+                    self.file, next_file = next_file, None
+                    self.write_segment += 1
+                    self.size = 0
+                    position = (self.write_segment, 0)
+            try:
+                os.fsync(file.fileno())
+            except OSError as e:
+                with self.cond:
+                    self._fail(e)
+                    if file is not self.file:
+                        self._discard_after(file, self.durable_position[1])
+                return
+            with self.cond:
+                if self.error:
+                    return  # append() falhou durante o fsync e descartou as linhas sem garantia
+                self.durable = target
+                self.durable_position = position
+                self.cond.notify_all()
+            if file is not self.file:
+                file.close()
+            self.replay_wakeup.set()
+
+    def _open_next_segment(self):
+        """Cria o próximo segmento com a entrada do diretório já sincronizada; None se falhar"""
+        path = self._segment_path(self.write_segment + 1)
+        try:
+            file = open(path, 'a+b', buffering=0)
+            directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+            return file
+        except OSError:
+            return None  # segue no segmento atual; nova tentativa no próximo ciclo
+
+    def _replay_loop(self):
+        while True:
+            self.replay_wakeup.wait(LOG_REPLAY_INTERVAL)
+            self.replay_wakeup.clear()
+            try:
+                self._replay()
+            except Exception:
+                # Banco indisponível ou travado: as linhas continuam no log para a próxima tentativa
+                time.sleep(1)
+
+    def _replay(self):
+        with self.cond:
+            durable_segment, durable_size = self.durable_position
+        if self.segment > durable_segment:
+            return
+        limit = LOG_REPLAY_BATCH_BYTES
+        if self.segment == durable_segment:
+            limit = min(limit, durable_size - self.offset)
+        path = self._segment_path(self.segment)
+        with open(path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(max(0, limit))
+        end = data.rfind(b"\n") + 1
+        if end:
+            rows, events = [], []
+            for line in data[:end].splitlines():
+                try:
+                    e = json.loads(line)
+                except ValueError:
+                    continue
+                answers = json.loads(e['answers'])
+                rows.append((e['survey_id'], self.storage.encode_answers(self._questions(e['survey_id']), answers),
+                             e['is_anonymous'], e['name'], e['email'], e['session_id'], e['submitted_at'],
+                             [tuple(t) for t in e['texts']]))
+                events.append((e['survey_id'], e['is_anonymous'], answers))
+            new_offset = self.offset + end
+            with self.cond:
+                self.replay_generation += 1
+            try:
+                seq = self.storage.save_responses_bulk(rows, (self.state_key, self.segment * self.SEGMENT_SPAN + new_offset))
+                with self.counters.lock:
+                    self.counters.record(seq, [(survey_id, is_anonymous) for survey_id, is_anonymous, _ in events])
+                    for survey_id, is_anonymous, answers in events:
+                        self.feed.publish(survey_id, is_anonymous, answers)
+                with self.cond:
+                    for survey_id, _, _ in events:
+                        self.pending[survey_id] = max(0, self.pending.get(survey_id, 0) - 1)
+            finally:
+                with self.cond:
+                    self.replay_generation += 1
+                    self.cond.notify_all()
+            self.offset = new_offset
+            self.replay_wakeup.set()  # pode haver mais um lote
+        elif self.segment < durable_segment:
+            # Segmento todo reaplicado: registra a passagem para o seguinte antes de apagá-lo.
+            # Se o banco falhar, nada muda e a próxima tentativa recomeça daqui
+            self.storage.set_state(self.state_key, (self.segment + 1) * self.SEGMENT_SPAN)
+            self.segment, self.offset = self.segment + 1, 0
+            self.replay_wakeup.set()
+            os.remove(path)
+
+    def _questions(self, survey_id: int) -> List[Dict]:
+        if survey_id not in self.questions:
+            survey = self.storage.get_survey(survey_id)
+            self.questions[survey_id] = json.loads(survey[1]) if survey else []
+        return self.questions[survey_id]
+
+@st.cache_resource
+def get_response_log() -> ResponseLog:
+    """Log do processo; ao ser criado, reaplica o que ficou pendente de uma execução anterior"""
+    return ResponseLog(RESPONSE_LOG, create_storage(), get_counters(), get_feed())
+
+# Controle de admissão
+class AdmissionController:
+    """Limita os respondentes simultâneos do processo e controla as cotas das pesquisas.
+
+    Quem chega com o servidor saturado entra numa fila (sala de espera) por ordem de chegada.
+    As cotas usam contagens em memória, sob um lock próprio: a última leitura das respostas no
+    banco e no log local (feita fora dos locks, a cada QUOTA_SYNC_INTERVAL), os envios
+    confirmados desde então e as reservas de envios em andamento.
+    """
+
+    def __init__(self, counters: CountersCache, log: Optional[ResponseLog], max_active: int):
+        self.counters = counters
+        self.log = log
+        self.max_active = max_active
+        self.lock = threading.Lock()
+        self.active: Dict[str, List[float]] = {}  # sessão -> [admitido em, último acesso]
+        self.waiting: OrderedDict = OrderedDict()  # sessão -> último acesso, por ordem de chegada
+        self.durations = deque(maxlen=200)  # segundos até o envio, para estimar a espera
+        self.quota_cond = threading.Condition()
+        self.quotas: Dict[int, Tuple[int, float]] = {}  # survey_id -> (aceitas na leitura, lida em)
+        self.accepted: Dict[int, int] = {}  # survey_id -> envios confirmados desde a leitura
+        self.reserved: Dict[int, int] = {}  # survey_id -> envios em andamento
+        self.syncing = set()  # pesquisas com leitura em andamento
+
+    def _expire(self, now: float):
+        for session_id, (_, seen) in list(self.active.items()):
+            if now - seen > RESPONDENT_IDLE_TIMEOUT:
+                del self.active[session_id]
+        for session_id, seen in list(self.waiting.items()):
+            if now - seen > WAITING_ROOM_TIMEOUT:
+                del self.waiting[session_id]
+
+    def average_duration(self) -> float:
+        return sum(self.durations) / len(self.durations) if self.durations else 120.0
+
+    def admit(self, session_id: str) -> Tuple[bool, int, float]:
+        """Retorna (admitido, posição na fila, espera estimada em segundos)"""
+        now = time.time()
+        with self.lock:
+            if session_id in self.active:
+                self.active[session_id][1] = now
+                return True, 0, 0.0
+            self._expire(now)
+            if not self.max_active:
+                self.active[session_id] = [now, now]
+                return True, 0, 0.0
+            self.waiting[session_id] = now  # mantém a posição de quem já estava na fila
+            free = self.max_active - len(self.active)
+            position = list(self.waiting).index(session_id)
+            if position < free:
+                del self.waiting[session_id]
+                self.active[session_id] = [now, now]
+                return True, 0, 0.0
+            ahead = position - free + 1
+            return False, ahead, ahead * self.average_duration() / self.max_active
+
+    def release(self, session_id: str, completed: bool = False):
+        with self.lock:
+            self.waiting.pop(session_id, None)
+            entry = self.active.pop(session_id, None)
+            if entry and completed:
+                self.durations.append(time.time() - entry[0])
+
+    def stats(self) -> Tuple[int, int]:
+        """Retorna (respondentes ativos, na fila)"""
+        with self.lock:
+            self._expire(time.time())
+            return len(self.active), len(self.waiting)
+
+    def stored(self, survey_id: int) -> int:
+        """Respostas no banco mais as pendentes no log local, lidas agora e sem segurar locks"""
+        while True:
+            generation, pending = self.log.replay_snapshot(survey_id) if self.log else (0, 0)
+            total = self.counters.survey_counts(survey_id)[0]
+            if not self.log or self.log.replay_snapshot(survey_id)[0] == generation:
+                return total + pending
+
+    def _sync(self, survey_id: int, since: float) -> int:
+        """Relê a cota se a última leitura começou antes de `since`; retorna as respostas aceitas.
+        Com uma leitura da mesma pesquisa em andamento, espera por ela em vez de repeti-la"""
+        with self.quota_cond:
+            while survey_id in self.syncing:
+                self.quota_cond.wait()
+            quota = self.quotas.get(survey_id)
+            if quota and quota[1] >= since:
+                return quota[0] + self.accepted.get(survey_id, 0)
+            self.syncing.add(survey_id)
+            accepted = self.accepted.get(survey_id, 0)
+        started = time.time()
+        try:
+            total = self.stored(survey_id)
+        except Exception:
+            with self.quota_cond:
+                self.syncing.discard(survey_id)
+                self.quota_cond.notify_all()
+            raise
+        with self.quota_cond:
+            self.syncing.discard(survey_id)
+            # Confirmados durante a leitura podem já estar em total: contados em dobro até a próxima
+            self.quotas[survey_id] = (total, started)
+            self.accepted[survey_id] = self.accepted.get(survey_id, 0) - accepted
+            self.quota_cond.notify_all()
+            return total + self.accepted[survey_id]
+
+    def used(self, survey_id: int) -> int:
+        """Respostas já aceitas: no banco, pendentes no log local e confirmadas desde a última leitura"""
+        with self.quota_cond:
+            quota = self.quotas.get(survey_id)
+            if quota and (survey_id in self.syncing or time.time() - quota[1] < QUOTA_SYNC_INTERVAL):
+                return quota[0] + self.accepted.get(survey_id, 0)
+        return self._sync(survey_id, time.time() - QUOTA_SYNC_INTERVAL)
+
+    def reserve(self, survey: Dict) -> bool:
+        """Reserva uma vaga da cota para um envio; False se a cota se esgotou"""
+        if not survey['max_responses']:
+            return True
+        self.used(survey['id'])  # lê a cota fora do lock, se preciso
+        with self.quota_cond:
+            survey_id = survey['id']
+            reserved = self.reserved.get(survey_id, 0)
+            if self.quotas[survey_id][0] + self.accepted.get(survey_id, 0) + reserved >= survey['max_responses']:
+                return False
+            self.reserved[survey_id] = reserved + 1
+            return True
+
+    def confirm(self, survey: Dict, accepted: bool):
+        """Libera a reserva após o envio; uma resposta aceita passa a contar em used()"""
+        if not survey['max_responses']:
+            return
+        with self.quota_cond:
+            self.reserved[survey['id']] -= 1
+            if accepted:
+                self.accepted[survey['id']] = self.accepted.get(survey['id'], 0) + 1
+
+@st.cache_resource
+def get_admission() -> AdmissionController:
+    """Controle de admissão compartilhado por todas as sessões do processo"""
+    return AdmissionController(get_counters(), get_response_log() if FAST_SUBMIT else None,
+                               MAX_ACTIVE_RESPONDENTS)
+
+# Profiler das execuções do script
+class RerunProfiler:
+    """Profiler por amostragem das execuções do script, ligado pelo painel de diagnóstico.
+
+    Desligado, profile() só confere uma flag. Ligado, uma thread lê a pilha das execuções
+    acompanhadas a cada PROFILE_INTERVAL e guarda uma a cada `every` execuções, além das mais
+    lentas que `slow_ms`, como pilhas colapsadas (formato do flamegraph.pl e do speedscope).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.every = 0
+        self.slow_ms = 0
+        self.runs = 0
+        self.targets: Dict[int, Dict[str, int]] = {}  # thread -> pilha colapsada -> amostras
+        self.profiles = deque(maxlen=PROFILE_RING_SIZE)
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def configure(self, enabled: bool, every: int, slow_ms: int):
+        with self.lock:
+            self.enabled, self.every, self.slow_ms = enabled, every, slow_ms
+            if enabled and self.thread is None:
+                self.thread = threading.Thread(target=self._sample_loop, daemon=True)
+                self.thread.start()
+
+    @contextmanager
+    def profile(self, page: str):
+        """Acompanha uma execução do script se ela for sorteada ou se puder ser lenta"""
+        if not self.enabled:
+            yield
+            return
+        thread_id = threading.get_ident()
+        with self.lock:
+            self.runs += 1
+            sampled = bool(self.every) and self.runs % self.every == 0
+            tracked = sampled or bool(self.slow_ms)
+            if tracked:
+                stacks = self.targets[thread_id] = {}
+        if not tracked:
+            yield
+            return
+        self.wakeup.set()
+        started_at, started = datetime.now(), time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started
+            with self.lock:
+                del self.targets[thread_id]
+            slow = bool(self.slow_ms) and duration * 1000 >= self.slow_ms
+            if sampled or slow:
+                self.profiles.append({
+                    'started_at': started_at,
+                    'page': page,
+                    'duration': duration,
+                    'reason': 'lenta' if slow else f'1 a cada {self.every}',
+                    'stacks': stacks
+                })
+
+    def _sample_loop(self):
+        while True:
+            self.wakeup.clear()
+            if not self.targets:
+                self.wakeup.wait()
+                continue
+            time.sleep(PROFILE_INTERVAL)
+            frames = sys._current_frames()
+            with self.lock:
+                for thread_id, stacks in self.targets.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        key = collapse_stack(frame)
+                        stacks[key] = stacks.get(key, 0) + 1
+
+def collapse_stack(frame) -> str:
+    """Pilha da raiz para a folha, a partir do primeiro quadro deste módulo (omite o Streamlit)"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append((code.co_filename, f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"))
+        frame = frame.f_back
+    names.reverse()
+    start = next((i for i, (filename, _) in enumerate(names) if filename == __file__), 0)
+    return ";".join(name for _, name in names[start:])
+
+def top_functions(stacks: Dict[str, int], duration: float, limit: int = 15) -> pd.DataFrame:
+    """Funções com mais tempo: próprio (na folha) e total (em qualquer ponto da pilha).
+
+    O intervalo real entre amostras varia com o GIL, então o tempo é rateado pela duração medida.
+    """
+    own, total = {}, {}
+    for stack, samples in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] = own.get(frames[-1], 0) + samples
+        for name in set(frames):
+            total[name] = total.get(name, 0) + samples
+    df = pd.DataFrame({'Próprio (ms)': pd.Series(own, dtype=float), 'Total (ms)': pd.Series(total, dtype=float)})
+    df = df.fillna(0) * (duration * 1000 / sum(stacks.values()))
+    return df.sort_values(['Total (ms)', 'Próprio (ms)'], ascending=False).head(limit).round(0)
+
+@st.cache_resource
+def get_profiler() -> RerunProfiler:
+    """Profiler compartilhado por todas as sessões do processo"""
+    return RerunProfiler()
 
 # Executor para tarefas em background
 executor = ThreadPoolExecutor(max_workers=3)
@@ -106,179 +1495,399 @@ def inject_css():
     """, unsafe_allow_html=True)
 
 # Funções de banco de dados
+def get_storage() -> BaseStorage:
+    """Backend de armazenamento da sessão atual"""
+    return st.session_state.storage
+
 def init_database():
     """Inicializa o banco de dados com as tabelas necessárias"""
-    with st.session_state.db_pool.get_connection() as conn:
-        c = conn.cursor()
-        
-        # Tabela de configuração admin
-        c.execute('''CREATE TABLE IF NOT EXISTS admin_config
-                     (id INTEGER PRIMARY KEY, 
-                      password_hash TEXT NOT NULL,
-                      is_default_pass BOOLEAN DEFAULT 1,
-                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-        
-        # Tabela de pesquisas
-        c.execute('''CREATE TABLE IF NOT EXISTS surveys
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      title TEXT NOT NULL,
-                      questions TEXT NOT NULL,
-                      is_active BOOLEAN DEFAULT 1,
-                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                      closed_at TIMESTAMP)''')
-        
-        # Tabela de respostas
-        c.execute('''CREATE TABLE IF NOT EXISTS responses
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      survey_id INTEGER NOT NULL,
-                      answers TEXT NOT NULL,
-                      is_anonymous BOOLEAN DEFAULT 1,
-                      respondent_name TEXT,
-                      respondent_email TEXT,
-                      ip_address TEXT,
-                      submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                      FOREIGN KEY (survey_id) REFERENCES surveys (id))''')
-        
-        # Tabela de rate limiting
-        c.execute('''CREATE TABLE IF NOT EXISTS rate_limits
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      session_id TEXT NOT NULL,
-                      action TEXT NOT NULL,
-                      timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-        
-        # Inserir senha admin padrão se não existir
-        c.execute("SELECT COUNT(*) FROM admin_config")
-        if c.fetchone()[0] == 0:
-            hashed = bcrypt.hashpw(DEFAULT_ADMIN_PASS.encode('utf-8'), bcrypt.gensalt())
-            c.execute("INSERT INTO admin_config (password_hash) VALUES (?)", (hashed.decode('utf-8'),))
-        
-        conn.commit()
+    get_storage().init_schema(
+        lambda: bcrypt.hashpw(DEFAULT_ADMIN_PASS.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    )
 
 def check_rate_limit(session_id: str, action: str, max_requests: int = 50, window_seconds: int = 300) -> bool:
     """Verifica rate limiting com limites mais permissivos para pesquisas"""
-    with st.session_state.db_pool.get_connection() as conn:
-        c = conn.cursor()
-        c.execute("""
-            SELECT COUNT(*) FROM rate_limits 
-            WHERE session_id = ? AND action = ? 
-            AND datetime(timestamp) > datetime('now', '-' || ? || ' seconds')
-        """, (session_id, action, window_seconds))
-        count = c.fetchone()[0]
-        
-        if count >= max_requests:
-            return False
-        
-        c.execute("INSERT INTO rate_limits (session_id, action) VALUES (?, ?)", 
-                 (session_id, action))
-        conn.commit()
-        return True
+    seq = get_storage().check_rate_limit(session_id, action, max_requests, window_seconds)
+    get_counters().record(seq, rate_limits=1)
+    return seq is not None
 
 def verify_admin_password(password: str) -> Tuple[bool, bool]:
     """Verifica senha admin e retorna (is_valid, is_default)"""
-    with st.session_state.db_pool.get_connection() as conn:
-        c = conn.cursor()
-        c.execute("SELECT password_hash, is_default_pass FROM admin_config LIMIT 1")
-        result = c.fetchone()
-        
-        if result:
-            stored_hash, is_default = result
-            is_valid = bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8'))
-            return is_valid, bool(is_default)
+    result = get_storage().get_admin_credentials()
+    if result:
+        stored_hash, is_default = result
+        is_valid = bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8'))
+        return is_valid, is_default
     return False, False
 
 def update_admin_password(new_password: str):
     """Atualiza senha do admin"""
-    with st.session_state.db_pool.get_connection() as conn:
-        c = conn.cursor()
-        hashed = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
-        c.execute("UPDATE admin_config SET password_hash = ?, is_default_pass = 0", 
-                 (hashed.decode('utf-8'),))
-        conn.commit()
+    hashed = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
+    get_storage().update_admin_password(hashed.decode('utf-8'))
 
-@st.cache_data(ttl=60)
 def get_active_survey() -> Optional[Dict]:
-    """Obtém pesquisa ativa com cache"""
-    with st.session_state.db_pool.get_connection() as conn:
-        c = conn.cursor()
-        c.execute("SELECT id, title, questions FROM surveys WHERE is_active = 1 ORDER BY id DESC LIMIT 1")
-        result = c.fetchone()
-        if result:
-            return {
-                'id': result[0],
-                'title': result[1],
-                'questions': json.loads(result[2])
-            }
+    """Obtém pesquisa ativa com cache, invalidado em todos os processos quando a geração muda"""
+    return load_active_survey(get_storage().survey_generation())
+
+@st.cache_data(ttl=60)
+def load_active_survey(generation: int) -> Optional[Dict]:
+    """Carrega a pesquisa ativa de uma geração"""
+    result = get_storage().get_active_survey()
+    if result:
+        return {
+            'id': result[0],
+            'title': result[1],
+            'questions': json.loads(result[2]),
+            'opens_at': parse_utc(result[3]),
+            'closes_at': parse_utc(result[4]),
+            'max_responses': result[5]
+        }
     return None
 
-def create_survey(title: str, questions: List[Dict]):
+def parse_utc(value) -> Optional[datetime]:
+    """Timestamp do banco (texto no SQLite, datetime no PostgreSQL), sempre gravado em UTC"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.strptime(value[:19], "%Y-%m-%d %H:%M:%S")
+    return value.replace(tzinfo=timezone.utc)
+
+def format_utc(value: Optional[datetime]) -> Optional[str]:
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S") if value else None
+
+def format_local(value: datetime) -> str:
+    return value.astimezone().strftime("%d/%m/%Y %H:%M")
+
+def survey_status(survey: Dict) -> str:
+    """'scheduled' antes da abertura, 'closed' se a janela ou a cota terminou (encerrando a pesquisa), senão 'open'"""
+    now = datetime.now(timezone.utc)
+    if survey['opens_at'] and now < survey['opens_at']:
+        return 'scheduled'
+    expired = survey['closes_at'] and now >= survey['closes_at']
+    if survey['max_responses'] and not expired and get_admission().used(survey['id']) >= survey['max_responses']:
+        # Antes de encerrar, confirma a cota com uma leitura nova do banco e do log
+        expired = get_admission().stored(survey['id']) >= survey['max_responses']
+    if expired:
+        close_survey(survey['id'])
+        return 'closed'
+    return 'open'
+
+def create_survey(title: str, questions: List[Dict], opens_at: Optional[datetime] = None,
+                  closes_at: Optional[datetime] = None, max_responses: Optional[int] = None):
     """Cria nova pesquisa"""
-    # Desativar pesquisas anteriores
-    with st.session_state.db_pool.get_connection() as conn:
-        c = conn.cursor()
-        c.execute("UPDATE surveys SET is_active = 0, closed_at = CURRENT_TIMESTAMP WHERE is_active = 1")
-        
-        # Criar nova pesquisa
-        c.execute("INSERT INTO surveys (title, questions) VALUES (?, ?)",
-                 (title, json.dumps(questions)))
-        conn.commit()
-    
-    # Limpar cache
-    get_active_survey.clear()
+    # Desativar pesquisas anteriores e criar nova
+    seq = get_storage().create_survey(title, json.dumps(questions), format_utc(opens_at),
+                                      format_utc(closes_at), max_responses or None)
+    get_counters().record(seq, surveys=1)
+
+def close_survey(survey_id: int):
+    """Encerra uma pesquisa"""
+    get_storage().close_survey(survey_id)
+
+@st.cache_data
+def get_survey_questions(survey_id: int) -> List[Dict]:
+    """Perguntas de uma pesquisa (imutáveis após a criação, cache sem TTL)"""
+    survey = get_storage().get_survey(survey_id)
+    return json.loads(survey[1]) if survey else []
+
+def text_answers(questions: List[Dict], answers: Dict) -> List[Tuple[int, str]]:
+    """Respostas de texto livre (texto_curto/texto_longo) a indexar para busca"""
+    texts = []
+    for i, q in enumerate(questions):
+        answer = answers.get(str(i))
+        if q['type'] in ('texto_curto', 'texto_longo') and isinstance(answer, str) and answer.strip():
+            texts.append((i, answer))
+    return texts
 
 def save_response(survey_id: int, answers: Dict, is_anonymous: bool, name: str = None, email: str = None):
     """Salva resposta da pesquisa"""
     session_id = st.session_state.get('session_id', 'unknown')
+    questions = get_survey_questions(survey_id)
+    storage = get_storage()
+    seq = storage.save_response(survey_id, storage.encode_answers(questions, answers), is_anonymous,
+                                name, email, session_id, text_answers(questions, answers))
+    counters = get_counters()
+    with counters.lock:
+        counters.record(seq, [(survey_id, is_anonymous)])
+        get_feed().publish(survey_id, is_anonymous, answers)
+
+def validate_answers(questions: List[Dict], answers: Dict) -> List[str]:
+    """Valida as respostas antes do envio; retorna as mensagens de erro"""
+    errors = []
+    missing_required = [i + 1 for i, q in enumerate(questions)
+                        if q.get('required', True) and str(i) not in answers]
+    if missing_required:
+        errors.append(f"⚠️ Por favor, responda as perguntas obrigatórias: {', '.join(map(str, missing_required))}")
     
-    with st.session_state.db_pool.get_connection() as conn:
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO responses (survey_id, answers, is_anonymous, respondent_name, 
-                                 respondent_email, ip_address)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (survey_id, json.dumps(answers), is_anonymous, name, email, session_id))
-        conn.commit()
+    invalid = []
+    for i, q in enumerate(questions):
+        answer = answers.get(str(i))
+        if answer is None or answer == '':
+            continue
+        if q['type'] == 'escala_1_5':
+            valid = isinstance(answer, int) and 1 <= answer <= 5
+        elif q['type'] == 'multipla_escolha':
+            valid = answer in q.get('options', [])
+        else:
+            max_chars = 200 if q['type'] == 'texto_curto' else q.get('max_chars', 1000)
+            valid = isinstance(answer, str) and len(answer) <= max_chars
+        if not valid:
+            invalid.append(i + 1)
+    if invalid:
+        errors.append(f"⚠️ Respostas inválidas nas perguntas: {', '.join(map(str, invalid))}")
+    return errors
+
+def submit_response(survey: Dict, answers: Dict, is_anonymous: bool, name: str = None, email: str = None) -> List[str]:
+    """Envio do respondente: valida e grava no log local (reaplicado no banco em segundo plano)"""
+    errors = validate_answers(survey['questions'], answers)
+    if errors:
+        return errors
+    
+    admission = get_admission()
+    if not admission.reserve(survey):
+        return ["⚠️ Esta pesquisa atingiu o número máximo de respostas."]
+    accepted = False
+    try:
+        if FAST_SUBMIT:
+            try:
+                get_response_log().append({
+                    'survey_id': survey['id'],
+                    'answers': json.dumps(answers),
+                    'is_anonymous': bool(is_anonymous),
+                    'name': name,
+                    'email': email,
+                    'session_id': st.session_state.get('session_id', 'unknown'),
+                    'submitted_at': datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                    'texts': text_answers(survey['questions'], answers)
+                })
+                accepted = True
+            except OSError:
+                pass  # log local com erro de disco: grava direto no banco
+        if not accepted:
+            save_response(survey['id'], answers, is_anonymous, name, email)
+            accepted = True
+        return []
+    finally:
+        admission.confirm(survey, accepted)
+
+def search_text_answers(survey_id: int, query: str, page: int = 0) -> Tuple[int, List[Tuple[int, int, str]]]:
+    """Busca paginada nas respostas de texto de uma pesquisa"""
+    return get_storage().search_answers(survey_id, query, SEARCH_PAGE_SIZE, page * SEARCH_PAGE_SIZE)
+
+@st.cache_resource
+def get_export_pool() -> ProcessPoolExecutor:
+    """Pool de processos compartilhado para formatar blocos da exportação"""
+    return ProcessPoolExecutor(max_workers=EXPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+def export_chunks_parallel(storage: BaseStorage, survey_id: int, questions: List[Dict], output: io.BytesIO):
+    """Divide a pesquisa em faixas de ID; cada processo do pool lê e formata a sua faixa,
+    e os blocos são gravados na ordem original"""
+    first_id, last_id = storage.response_id_range(survey_id)
+    if first_id is None:
+        return
+    
+    pool = get_export_pool()
+    source = storage.export_source()
+    pending = deque()
+    for start in range(first_id, last_id + 1, EXPORT_CHUNK_SIZE):
+        pending.append(pool.submit(export_range, source, questions, survey_id, start, start + EXPORT_CHUNK_SIZE - 1))
+        # Limitar blocos em memória: escrever o mais antigo assim que o pool estiver cheio
+        if len(pending) >= EXPORT_WORKERS * 2:
+            output.write(pending.popleft().result())
+    while pending:
+        output.write(pending.popleft().result())
 
 def export_responses_to_csv(survey_id: int) -> bytes:
     """Exporta respostas para CSV"""
-    with st.session_state.db_pool.get_connection() as conn:
-        c = conn.cursor()
-        
-        # Obter dados da pesquisa
-        c.execute("SELECT title, questions FROM surveys WHERE id = ?", (survey_id,))
-        survey = c.fetchone()
-        if not survey:
-            return None
+    storage = get_storage()
+    
+    # Obter dados da pesquisa
+    survey = storage.get_survey(survey_id)
+    if not survey:
+        return None
+    
+    questions = json.loads(survey[1])
+    output = io.BytesIO()
+    output.write(csv_header(questions).encode('utf-8'))
+    
+    count, _ = get_counters().survey_counts(survey_id)
+    if EXPORT_WORKERS > 1 and count > EXPORT_CHUNK_SIZE:
+        header_end = output.tell()
+        try:
+            export_chunks_parallel(storage, survey_id, questions, output)
+        except BrokenProcessPool:
+            # Um processo do pool morreu (ex.: falta de memória) e o pool não se recupera:
+            # descartá-lo do cache e refazer a exportação num pool novo
+            get_export_pool().shutdown(wait=False, cancel_futures=True)
+            get_export_pool.clear()
+            output.seek(header_end)
+            output.truncate()
+            export_chunks_parallel(storage, survey_id, questions, output)
+    else:
+        responses = storage.iter_responses(survey_id)
+        while True:
+            batch = list(itertools.islice(responses, EXPORT_CHUNK_SIZE))
+            if not batch:
+                break
+            output.write(format_rows(questions, batch).encode('utf-8'))
+    
+    return output.getvalue()
+
+class ReportColumns:
+    """Respostas de uma pesquisa decodificadas em colunas (ver decode_columns); não muda depois de criada"""
+
+    def __init__(self, labels: Dict[int, List[str]], last_id: int, submitted_at: np.ndarray,
+                 is_anonymous: np.ndarray, columns: List[np.ndarray]):
+        self.labels = labels
+        self.last_id = last_id
+        self.submitted_at = submitted_at
+        self.is_anonymous = is_anonymous
+        self.columns = columns
+
+def load_report_columns(storage: BaseStorage, survey_id: int, questions: List[Dict],
+                        cached: Optional[ReportColumns] = None) -> ReportColumns:
+    """Decodifica as respostas com ID acima de cached.last_id e junta às de cached"""
+    labels = {i: list(values) for i, values in cached.labels.items()} if cached else {}
+    last_id, total = cached.last_id if cached else 0, 0
+    parts = [(cached.submitted_at, cached.is_anonymous, cached.columns)] if cached else []
+    rows = storage.iter_report_rows(survey_id, last_id)
+    while True:
+        batch = list(itertools.islice(rows, REPORT_BATCH_SIZE))
+        total = batch[0][0] if batch else total
+        batch = [row for row in batch if row[1] is not None]
+        if not batch:
+            break
+        last_id = batch[-1][1]
+        parts.append((pd.to_datetime([row[2] for row in batch], format='ISO8601').values,
+                      np.array([bool(row[3]) for row in batch]),
+                      decode_columns(questions, [row[4] for row in batch], labels)))
+    
+    if not parts:
+        parts.append((np.array([], 'datetime64[ns]'), np.array([], bool), decode_columns(questions, [], labels)))
+    loaded = ReportColumns(labels, last_id, np.concatenate([p[0] for p in parts]),
+                           np.concatenate([p[1] for p in parts]),
+                           [np.concatenate(column) for column in zip(*(p[2] for p in parts))])
+    if cached and len(loaded.is_anonymous) != total:
+        # Resposta de ID menor confirmada depois da última leitura: reler tudo
+        return load_report_columns(storage, survey_id, questions)
+    return loaded
+
+class ReportCache:
+    """Colunas do relatório das últimas pesquisas consultadas: novas versões só leem as respostas novas"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.surveys: OrderedDict = OrderedDict()  # survey_id -> ReportColumns, menos recente primeiro
+
+    def load(self, storage: BaseStorage, survey_id: int, questions: List[Dict]) -> ReportColumns:
+        with self.lock:
+            cached = self.surveys.get(survey_id)
+        # Leitura e decodificação fora do lock
+        loaded = load_report_columns(storage, survey_id, questions, cached)
+        with self.lock:
+            current = self.surveys.get(survey_id)
+            if current is None or current.last_id <= loaded.last_id:
+                self.surveys[survey_id] = loaded
+            self.surveys.move_to_end(survey_id)
+            while len(self.surveys) > REPORT_CACHE_SURVEYS:
+                self.surveys.popitem(last=False)
+        return loaded
+
+@st.cache_resource
+def get_report_cache() -> ReportCache:
+    return ReportCache()
+
+def summarize_counts(counts: np.ndarray) -> Tuple[int, float, float, float]:
+    """(n, média, mediana, desvio padrão amostral) a partir de counts[valor] = ocorrências"""
+    n = int(counts.sum())
+    if not n:
+        return 0, np.nan, np.nan, np.nan
+    values = np.arange(len(counts))
+    mean = (values * counts).sum() / n
+    std = np.sqrt(((values - mean) ** 2 * counts).sum() / (n - 1)) if n > 1 else np.nan
+    cumulative = np.cumsum(counts)
+    median = (np.searchsorted(cumulative, (n - 1) // 2, side='right') +
+              np.searchsorted(cumulative, n // 2, side='right')) / 2
+    return n, mean, median, std
+
+@st.cache_data(max_entries=20)
+def build_report(survey_id: int, version: int) -> Optional[Dict]:
+    """Estatísticas da pesquisa; version (nº de respostas) invalida o cache quando chegam novas"""
+    survey = get_storage().get_survey(survey_id)
+    if not survey:
+        return None
+    
+    questions = json.loads(survey[1])
+    data = get_report_cache().load(get_storage(), survey_id, questions)
+    anonymous = data.is_anonymous
+    
+    report = {
+        'title': survey[0],
+        'total': len(anonymous),
+        'anonymous': int(anonymous.sum()),
+        'questions': []
+    }
+    
+    # Envios ao longo do tempo: por hora em pesquisas curtas, por dia nas demais
+    if len(anonymous):
+        submitted_at = data.submitted_at
+        span = submitted_at.max() - submitted_at.min()
+        freq = 'h' if span <= np.timedelta64(3, 'D') else 'D'
+        report['timeline'] = pd.Series(1, index=submitted_at).resample(freq).size().rename('Respostas')
+    
+    # Escalas e tamanhos de texto são inteiros pequenos: as estatísticas saem de um histograma
+    # (np.bincount, uma passada) em vez de ordenar a coluna para a mediana
+    for i, q in enumerate(questions):
+        column = data.columns[i]
+        item = {'text': q['text'], 'type': q['type']}
         
-        questions = json.loads(survey[1])
+        if q['type'] == 'escala_1_5':
+            answered = column > 0
+            counts = np.bincount(column, minlength=6)
+            counts[0] = 0  # sem resposta
+            n, mean, median, std = summarize_counts(counts)
+            distribution = counts[1:6]
+            item['stats'] = pd.Series({
+                'Respostas': n,
+                'Média': mean,
+                'Mediana': median,
+                'Desvio padrão': std
+            })
+            item['distribution'] = pd.Series(distribution, index=range(1, 6))
         
-        # Obter respostas
-        c.execute("""
-            SELECT id, submitted_at, answers, is_anonymous, respondent_name, respondent_email
-            FROM responses WHERE survey_id = ?
-            ORDER BY submitted_at
-        """, (survey_id,))
+        elif q['type'] == 'multipla_escolha':
+            answered = column > 0
+            labels = data.labels[i]
+            counts = np.bincount(column, minlength=len(labels) + 1)[1:]
+            # Opções repetidas na pesquisa somam numa linha só
+            item['distribution'] = pd.Series(counts, index=labels).groupby(level=0, sort=False).sum()
         
-        responses = c.fetchall()
-        
-        # Preparar dados para CSV
-        data = []
-        for resp in responses:
-            row = {
-                'ID': resp[0],
-                'Data/Hora': resp[1],
-                'Anônimo': 'Sim' if resp[3] else 'Não',
-                'Nome': resp[4] or '',
-                'Email': resp[5] or ''
-            }
-            
-            answers = json.loads(resp[2])
-            for i, q in enumerate(questions):
-                row[f"Q{i+1}: {q['text'][:50]}"] = answers.get(str(i), '')
-            
-            data.append(row)
+        else:
+            answered = column > 0  # texto vazio conta como sem resposta
+            counts = np.bincount(column[answered], minlength=1)
+            n, mean, median, _ = summarize_counts(counts)
+            item['stats'] = pd.Series({
+                'Respostas': n,
+                'Média de caracteres': mean,
+                'Mediana de caracteres': median,
+                'Máximo de caracteres': len(counts) - 1 if n else 0
+            })
+            if n:
+                present = np.flatnonzero(counts)
+                # Mesmas faixas de np.histogram sobre os tamanhos, calculadas a partir das contagens
+                hist, edges = np.histogram(np.arange(len(counts)), bins=min(10, len(present)),
+                                           range=(present[0], present[-1]), weights=counts)
+                labels = [f"{int(edges[j])}-{int(edges[j + 1])}" for j in range(len(hist))]
+                item['distribution'] = pd.Series(hist.astype(int), index=labels)
         
-        df = pd.DataFrame(data)
-        return df.to_csv(index=False).encode('utf-8')
+        # Comparação anônimos x identificados
+        item['by_identity'] = pd.Series({
+            'Anônimos': int((answered & anonymous).sum()),
+            'Identificados': int((answered & ~anonymous).sum())
+        })
+        report['questions'].append(item)
+    
+    return report
 
 def send_email_with_retry(to_email: str, subject: str, body: str, attachment: bytes = None, 
                          attachment_name: str = None) -> bool:
@@ -346,6 +1955,10 @@ def main():
     # Inicializar banco
     init_database()
     
+    # Recuperar respostas pendentes no log local (envio rápido)
+    if FAST_SUBMIT:
+        get_response_log()
+    
     st.title("📋 Pesquisa App!")
     
     # Navegação principal
@@ -424,7 +2037,8 @@ def show_admin_page():
                             st.rerun()
         
         # Tabs do admin
-        tab1, tab2, tab3, tab4 = st.tabs(["📊 Dashboard", "➕ Nova Pesquisa", "📥 Exportar", "🔧 Diagnóstico"])
+        tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["📊 Dashboard", "➕ Nova Pesquisa", "📥 Exportar",
+                                                      "📈 Relatório", "🔎 Buscar", "🔧 Diagnóstico"])
         
         with tab1:
             show_admin_dashboard()
@@ -436,50 +2050,121 @@ def show_admin_page():
             show_export_section()
         
         with tab4:
+            show_report_section()
+        
+        with tab5:
+            show_search_section()
+        
+        with tab6:
             show_diagnostics()
 
 def show_admin_dashboard():
     """Dashboard administrativo"""
     survey = get_active_survey()
     
+    if survey and survey_status(survey) == 'closed':
+        survey = None
+    
     if survey:
         st.success(f"✅ Pesquisa ativa: **{survey['title']}**")
+        show_survey_limits(survey)
         
-        # Estatísticas
-        with st.session_state.db_pool.get_connection() as conn:
-            c = conn.cursor()
-            c.execute("SELECT COUNT(*) FROM responses WHERE survey_id = ?", (survey['id'],))
-            total_responses = c.fetchone()[0]
-            
-            c.execute("""
-                SELECT COUNT(*) FROM responses 
-                WHERE survey_id = ? AND is_anonymous = 1
-            """, (survey['id'],))
-            anonymous_responses = c.fetchone()[0]
-        
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("Total de Respostas", total_responses)
-        with col2:
-            st.metric("Respostas Anônimas", anonymous_responses)
-        with col3:
-            st.metric("Total de Perguntas", len(survey['questions']))
+        # Estatísticas (atualizadas ao vivo)
+        show_live_feed(survey)
         
         if st.button("🛑 Encerrar Pesquisa", type="secondary"):
-            with st.session_state.db_pool.get_connection() as conn:
-                c = conn.cursor()
-                c.execute("""
-                    UPDATE surveys 
-                    SET is_active = 0, closed_at = CURRENT_TIMESTAMP 
-                    WHERE id = ?
-                """, (survey['id'],))
-                conn.commit()
-            get_active_survey.clear()
+            close_survey(survey['id'])
             st.success("Pesquisa encerrada!")
             st.rerun()
     else:
         st.info("Nenhuma pesquisa ativa no momento.")
 
+def show_survey_limits(survey: Dict):
+    """Agendamento, cota e ocupação da pesquisa ativa"""
+    details = []
+    if survey['opens_at']:
+        details.append(f"abre em {format_local(survey['opens_at'])}")
+    if survey['closes_at']:
+        details.append(f"encerra em {format_local(survey['closes_at'])}")
+    if survey['max_responses']:
+        details.append(f"cota: {get_admission().used(survey['id'])}/{survey['max_responses']} respostas")
+    active, waiting = get_admission().stats()
+    capacity = MAX_ACTIVE_RESPONDENTS or "∞"
+    details.append(f"respondentes ativos: {active}/{capacity}, na fila: {waiting}")
+    st.caption(" · ".join(details))
+
+def start_live_feed(survey: Dict) -> Dict:
+    """Linha de base do painel ao vivo, lida junto com a posição atual do barramento"""
+    counters = get_counters()
+    total, anonymous = counters.survey_counts(survey['id'])
+    with counters.lock:
+        # Contagens e posição do barramento lidas juntas (record() e publish() também usam o lock)
+        total, anonymous = counters.cached_survey_counts(survey['id']) or (total, anonymous)
+        seq = get_feed().seq
+    return {
+        'survey_id': survey['id'],
+        'seq': seq,
+        'total': total,
+        'anonymous': anonymous,
+        'synced_at': time.time(),
+        'new': 0,
+        'scales': {},   # pergunta -> [soma, quantidade]
+        'options': {}   # pergunta -> {opção: quantidade}
+    }
+
+@st.fragment(run_every=LIVE_FEED_INTERVAL)
+def show_live_feed(survey: Dict):
+    """Métricas da pesquisa ativa, aplicando apenas os deltas publicados desde a última execução"""
+    live = st.session_state.get('live_feed')
+    if not live or live['survey_id'] != survey['id']:
+        live = st.session_state.live_feed = start_live_feed(survey)
+    
+    events = get_feed().since(live['seq'])
+    if events is None:
+        # Barramento descartou eventos: recomeçar a partir dos contadores
+        live = st.session_state.live_feed = start_live_feed(survey)
+        events = []
+    
+    for seq, survey_id, is_anonymous, answers in events:
+        live['seq'] = seq
+        if survey_id != survey['id']:
+            continue
+        live['total'] += 1
+        live['anonymous'] += int(is_anonymous)
+        live['new'] += 1
+        for i, q in enumerate(survey['questions']):
+            answer = answers.get(str(i))
+            if answer in (None, ''):
+                continue
+            if q['type'] == 'escala_1_5':
+                totals = live['scales'].setdefault(i, [0, 0])
+                totals[0] += int(answer)
+                totals[1] += 1
+            elif q['type'] == 'multipla_escolha':
+                options = live['options'].setdefault(i, {})
+                options[answer] = options.get(answer, 0) + 1
+    
+    if time.time() - live['synced_at'] > LIVE_FEED_RESYNC:
+        # Cada worker tem seu próprio barramento: corrigir totais pelos contadores do banco
+        baseline = start_live_feed(survey)
+        for key in ('seq', 'total', 'anonymous', 'synced_at'):
+            live[key] = baseline[key]
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total de Respostas", live['total'], delta=live['new'] or None)
+    with col2:
+        st.metric("Respostas Anônimas", live['anonymous'])
+    with col3:
+        st.metric("Total de Perguntas", len(survey['questions']))
+    
+    if live['new']:
+        with st.expander(f"🔴 Ao vivo: {live['new']} nova(s) resposta(s) desde a abertura do painel"):
+            for i, (total, n) in sorted(live['scales'].items()):
+                st.text(f"Q{i+1}: média {total / n:.2f} ({n} respostas)")
+            for i, options in sorted(live['options'].items()):
+                st.text(f"Q{i+1}: " + ", ".join(f"{opt}: {n}" for opt, n in options.items()))
+
 def show_create_survey():
     """Interface para criar nova pesquisa"""
     st.markdown("#### Criar Nova Pesquisa")
@@ -496,6 +2181,29 @@ def show_create_survey():
     # Título da pesquisa
     title = st.text_input("Título da Pesquisa", max_chars=200)
     
+    # Agendamento e cota (horários no fuso do servidor)
+    opens_at = closes_at = None
+    with st.expander("⏱️ Agendamento e cota"):
+        if st.checkbox("Agendar abertura"):
+            col1, col2 = st.columns(2)
+            with col1:
+                open_date = st.date_input("Data de abertura", key="opens_date")
+            with col2:
+                open_time = st.time_input("Hora de abertura", key="opens_time")
+            opens_at = datetime.combine(open_date, open_time).astimezone(timezone.utc)
+        if st.checkbox("Agendar encerramento"):
+            col1, col2 = st.columns(2)
+            with col1:
+                close_date = st.date_input("Data de encerramento", key="closes_date")
+            with col2:
+                close_time = st.time_input("Hora de encerramento", key="closes_time")
+            closes_at = datetime.combine(close_date, close_time).astimezone(timezone.utc)
+        max_responses = st.number_input("Máximo de respostas (0 = sem limite)", min_value=0, step=1, value=0)
+    schedule_error = None
+    if closes_at and closes_at <= max(opens_at or closes_at, datetime.now(timezone.utc)):
+        schedule_error = "O encerramento deve ser futuro e posterior à abertura."
+        st.error(f"⚠️ {schedule_error}")
+    
     # Adicionar perguntas
     st.markdown("##### Perguntas")
     
@@ -555,7 +2263,8 @@ def show_create_survey():
         else:
             st.success(f"Total de perguntas: {total_questions} (incluindo pergunta final)")
             
-            if st.button("🚀 Criar Pesquisa", type="primary", disabled=(not title or total_questions < 2)):
+            if st.button("🚀 Criar Pesquisa", type="primary",
+                         disabled=(not title or total_questions < 2 or schedule_error is not None)):
                 # Adicionar pergunta final
                 final_question = {
                     'text': 'Comentários adicionais ou sugestões (opcional)',
@@ -567,7 +2276,7 @@ def show_create_survey():
                 
                 all_questions = st.session_state.survey_questions + [final_question]
                 
-                create_survey(title, all_questions)
+                create_survey(title, all_questions, opens_at, closes_at, int(max_responses))
                 st.session_state.survey_questions = []
                 st.success("✅ Pesquisa criada e ativada com sucesso!")
                 st.balloons()
@@ -578,25 +2287,19 @@ def show_export_section():
     st.markdown("#### Exportar Respostas")
     
     # Obter pesquisas
-    with st.session_state.db_pool.get_connection() as conn:
-        c = conn.cursor()
-        c.execute("SELECT id, title, created_at FROM surveys ORDER BY id DESC")
-        surveys = c.fetchall()
+    surveys = get_storage().list_surveys()
     
     if not surveys:
         st.info("Nenhuma pesquisa encontrada.")
         return
     
     # Selecionar pesquisa
-    survey_options = {f"{s[0]} - {s[1]} ({s[2][:10]})": s[0] for s in surveys}
+    survey_options = {f"{s[0]} - {s[1]} ({str(s[2])[:10]})": s[0] for s in surveys}
     selected = st.selectbox("Selecione a pesquisa", list(survey_options.keys()))
     survey_id = survey_options[selected]
     
     # Contar respostas
-    with st.session_state.db_pool.get_connection() as conn:
-        c = conn.cursor()
-        c.execute("SELECT COUNT(*) FROM responses WHERE survey_id = ?", (survey_id,))
-        count = c.fetchone()[0]
+    count, _ = get_counters().survey_counts(survey_id)
     
     st.info(f"Total de respostas: {count}")
     
@@ -633,6 +2336,113 @@ def show_export_section():
                 else:
                     st.error("Email do destinatário não configurado (OWNER_EMAIL)")
 
+def show_report_section():
+    """Relatório estatístico por pergunta"""
+    st.markdown("#### Relatório")
+    
+    surveys = get_storage().list_surveys()
+    if not surveys:
+        st.info("Nenhuma pesquisa encontrada.")
+        return
+    
+    survey_options = {f"{s[0]} - {s[1]} ({str(s[2])[:10]})": s[0] for s in surveys}
+    selected = st.selectbox("Selecione a pesquisa", list(survey_options.keys()), key="report_survey")
+    survey_id = survey_options[selected]
+    
+    count, _ = get_counters().survey_counts(survey_id)
+    if count == 0:
+        st.info("Nenhuma resposta para esta pesquisa.")
+        return
+    
+    # O relatório só é montado sob pedido: as abas rodam a cada rerun do admin, e a primeira
+    # montagem de uma pesquisa grande leva segundos. Depois, reruns usam a versão pedida (cache)
+    requested = st.session_state.get('report_request')
+    shown = requested is not None and requested[0] == survey_id
+    if st.button("🔄 Atualizar relatório" if shown else "📊 Gerar relatório", key="report_build"):
+        st.session_state.report_request = requested = (survey_id, count)
+        shown = True
+    if not shown:
+        st.caption(f"{count} respostas")
+        return
+    
+    with st.spinner("Montando relatório..."):
+        report = build_report(*requested)
+    if not report:
+        return
+    if count > requested[1]:
+        st.caption(f"{count - requested[1]} resposta(s) nova(s) desde a geração do relatório")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total de Respostas", report['total'])
+    with col2:
+        st.metric("Anônimas", report['anonymous'])
+    with col3:
+        st.metric("Identificadas", report['total'] - report['anonymous'])
+    
+    if 'timeline' in report:
+        st.markdown("##### Envios ao longo do tempo")
+        st.line_chart(report['timeline'])
+    
+    for i, item in enumerate(report['questions']):
+        st.markdown(f"##### Q{i+1}: {item['text']}")
+        if 'stats' in item:
+            st.dataframe(item['stats'].round(2).rename('Valor'), use_container_width=True)
+        if 'distribution' in item:
+            st.bar_chart(item['distribution'])
+        st.caption(" · ".join(f"{label}: {n}" for label, n in item['by_identity'].items()))
+
+def show_search_section():
+    """Busca nas respostas de texto livre"""
+    st.markdown("#### Buscar nas Respostas")
+    
+    surveys = get_storage().list_surveys()
+    if not surveys:
+        st.info("Nenhuma pesquisa encontrada.")
+        return
+    
+    survey_options = {f"{s[0]} - {s[1]} ({str(s[2])[:10]})": s[0] for s in surveys}
+    selected = st.selectbox("Selecione a pesquisa", list(survey_options.keys()), key="search_survey")
+    survey_id = survey_options[selected]
+    query = st.text_input("Termos de busca", max_chars=200, key="search_query")
+    
+    if not query.strip():
+        return
+    
+    # Voltar à primeira página quando a busca muda
+    if st.session_state.get('search_key') != (survey_id, query):
+        st.session_state.search_key = (survey_id, query)
+        st.session_state.search_page = 0
+    page = st.session_state.search_page
+    
+    total, results = search_text_answers(survey_id, query, page)
+    if not total:
+        st.info("Nenhuma resposta encontrada.")
+        return
+    
+    pages = (min(total, SEARCH_RANK_CANDIDATES) + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+    st.caption(f"{total} resultado(s) — página {page + 1} de {pages}")
+    if total > SEARCH_RANK_CANDIDATES:
+        st.caption(f"Exibindo as {SEARCH_RANK_CANDIDATES} respostas mais recentes; refine a busca para ver as demais.")
+    
+    questions = get_survey_questions(survey_id)
+    for response_id, question, snippet in results:
+        # Escapar o texto do respondente antes de inserir os destaques
+        highlighted = html.escape(snippet).replace("\x02", "<mark>").replace("\x03", "</mark>")
+        question_text = questions[question]['text'][:50] if question < len(questions) else ""
+        st.markdown(f"**Resposta #{response_id}** · Q{question + 1}: {html.escape(question_text)}<br>{highlighted}",
+                    unsafe_allow_html=True)
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if page > 0 and st.button("← Anterior", key="search_prev"):
+            st.session_state.search_page = page - 1
+            st.rerun()
+    with col3:
+        if page < pages - 1 and st.button("Próxima →", key="search_next"):
+            st.session_state.search_page = page + 1
+            st.rerun()
+
 def show_diagnostics():
     """Painel de diagnóstico do sistema"""
     st.markdown("#### Diagnóstico do Sistema")
@@ -640,14 +2450,9 @@ def show_diagnostics():
     # Status do banco
     st.markdown("##### 🗄️ Banco de Dados")
     try:
-        with st.session_state.db_pool.get_connection() as conn:
-            c = conn.cursor()
-            c.execute("SELECT COUNT(*) FROM surveys")
-            total_surveys = c.fetchone()[0]
-            c.execute("SELECT COUNT(*) FROM responses")
-            total_responses = c.fetchone()[0]
-            c.execute("SELECT COUNT(*) FROM rate_limits WHERE datetime(timestamp) > datetime('now', '-1 hour')")
-            recent_limits = c.fetchone()[0]
+        counters = get_counters()
+        total_surveys, total_responses = counters.get_totals()
+        recent_limits = counters.recent_rate_limits()
         
         col1, col2, col3 = st.columns(3)
         with col1:
@@ -681,22 +2486,62 @@ def show_diagnostics():
     
     # Pool de conexões
     st.markdown("##### 🔌 Pool de Conexões")
-    st.text(f"Conexões disponíveis: {len(st.session_state.db_pool.pool)}/{st.session_state.db_pool.pool_size}")
+    if FAST_SUBMIT:
+        log = get_response_log()
+        if log.error:
+            st.error(f"❌ Log de envio rápido desativado ({log.error}); envios gravados direto no banco")
+        st.text(f"Log de envio rápido: {log.pending_bytes()} bytes pendentes")
+    available, pool_size = get_storage().pool_status()
+    st.text(f"Backend: {'PostgreSQL' if isinstance(get_storage(), PostgresStorage) else 'SQLite'}")
+    st.text(f"Conexões disponíveis: {available}/{pool_size}")
+    
+    show_profiler_section()
     
     # Limpar dados antigos
     if st.button("🧹 Limpar rate limits antigos (> 1 dia)"):
-        with st.session_state.db_pool.get_connection() as conn:
-            c = conn.cursor()
-            c.execute("DELETE FROM rate_limits WHERE datetime(timestamp) < datetime('now', '-1 day')")
-            deleted = c.rowcount
-            conn.commit()
+        deleted = get_storage().purge_rate_limits(86400)
         st.success(f"Removidos {deleted} registros")
 
+def show_profiler_section():
+    """Configuração do profiler e perfis recentes das execuções do script"""
+    st.markdown("##### ⏱️ Profiler")
+    profiler = get_profiler()
+    enabled = st.checkbox("Ativar profiler (todas as sessões deste processo)", value=profiler.enabled)
+    col1, col2 = st.columns(2)
+    with col1:
+        every = st.number_input("Perfilar 1 a cada N execuções (0 = nunca)", min_value=0, step=1,
+                                value=profiler.every)
+    with col2:
+        slow_ms = st.number_input("Perfilar execuções acima de (ms, 0 = nunca)", min_value=0, step=100,
+                                  value=profiler.slow_ms)
+    profiler.configure(enabled, int(every), int(slow_ms))
+    
+    profiles = list(profiler.profiles)
+    if not profiles:
+        st.caption("Nenhum perfil capturado.")
+        return
+    labels = [f"{p['started_at'].strftime('%H:%M:%S')} · {p['page']} · {p['duration'] * 1000:.0f} ms · {p['reason']}"
+              for p in reversed(profiles)]
+    selected = st.selectbox("Perfis recentes", range(len(labels)), format_func=lambda i: labels[i])
+    profile = profiles[-1 - selected]
+    if not profile['stacks']:
+        st.caption("Execução curta demais para ser amostrada.")
+        return
+    st.caption(f"{sum(profile['stacks'].values())} amostras")
+    st.dataframe(top_functions(profile['stacks'], profile['duration']), use_container_width=True)
+    st.download_button(
+        label="💾 Pilhas colapsadas (flamegraph)",
+        data="\n".join(f"{stack} {samples}" for stack, samples in profile['stacks'].items()),
+        file_name=f"perfil_{profile['started_at'].strftime('%Y%m%d_%H%M%S')}.folded",
+        mime="text/plain"
+    )
+
 def show_respond_page():
     """Página para responder pesquisa"""
     st.markdown("### Responder Pesquisa")
     
     if st.button("← Voltar"):
+        get_admission().release(st.session_state.session_id)
         st.session_state.page = 'home'
         st.rerun()
     
@@ -714,6 +2559,20 @@ def show_respond_page():
         st.warning("📋 Não há pesquisa ativa no momento.")
         return
     
+    status = survey_status(survey)
+    if status == 'scheduled':
+        st.info(f"🕒 A pesquisa **{survey['title']}** abre em {format_local(survey['opens_at'])}.")
+        return
+    if status == 'closed':
+        st.warning("📋 Esta pesquisa foi encerrada.")
+        return
+    
+    # Sala de espera quando o servidor está no limite de respondentes
+    admitted, _, _ = get_admission().admit(st.session_state.session_id)
+    if not admitted:
+        show_waiting_room()
+        return
+    
     st.markdown(f"#### {survey['title']}")
     
     # Inicializar estado
@@ -840,23 +2699,21 @@ def show_respond_page():
             else:
                 # Último botão - Enviar (sempre ativo)
                 if st.button("✅ Enviar Respostas", type="primary"):
-                    # Verificar se todas as respostas obrigatórias foram preenchidas
-                    missing_required = []
-                    for i, q in enumerate(questions):
-                        if q.get('required', True) and str(i) not in st.session_state.answers:
-                            missing_required.append(i + 1)
+                    # Validar e enviar (gravação no banco é assíncrona no envio rápido)
+                    with st.spinner("Salvando respostas..."):
+                        errors = submit_response(
+                            survey,
+                            st.session_state.answers,
+                            st.session_state.is_anonymous,
+                            st.session_state.respondent_name if not st.session_state.is_anonymous else None,
+                            st.session_state.respondent_email if not st.session_state.is_anonymous else None
+                        )
                     
-                    if missing_required:
-                        st.error(f"⚠️ Por favor, responda as perguntas obrigatórias: {', '.join(map(str, missing_required))}")
+                    if errors:
+                        for error in errors:
+                            st.error(error)
                     else:
-                        with st.spinner("Salvando respostas..."):
-                            save_response(
-                                survey['id'],
-                                st.session_state.answers,
-                                st.session_state.is_anonymous,
-                                st.session_state.respondent_name if not st.session_state.is_anonymous else None,
-                                st.session_state.respondent_email if not st.session_state.is_anonymous else None
-                            )
+                        get_admission().release(st.session_state.session_id, completed=True)
                         
                         # Limpar estado
                         for key in ['current_question', 'answers', 'anonimato_definido', 'rate_limit_checked']:
@@ -870,8 +2727,19 @@ def show_respond_page():
                             st.session_state.page = 'home'
                             st.rerun()
 
+@st.fragment(run_every=WAITING_ROOM_INTERVAL)
+def show_waiting_room():
+    """Posição na fila e espera estimada; recarrega a página quando a vaga é liberada"""
+    admitted, position, eta = get_admission().admit(st.session_state.session_id)
+    if admitted:
+        st.rerun()
+    st.info(f"⏳ Muitas pessoas respondendo agora. Você está na posição **{position}** da fila.")
+    minutes = max(1, round(eta / 60))
+    st.caption(f"Espera estimada: cerca de {minutes} minuto(s). Esta página avança sozinha, não feche a aba.")
+
 if __name__ == "__main__":
-    main()
+    with get_profiler().profile(st.session_state.get('page', 'home')):
+        main()
 
 st.markdown("""
 <style>
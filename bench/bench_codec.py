@@ -0,0 +1,81 @@
+"""Benchmark da codificação da coluna answers: JSON (versão 0) x binário (versão 1).
+
+Uso: python bench/bench_codec.py [--responses 200000]
+
+Mede os bytes por resposta (valor codificado e arquivo SQLite, com e sem as perguntas de texto)
+e a vazão de codificação e decodificação: linha a linha, decode_many, row_decoder (exportação),
+format_rows (CSV completo) e decode_columns.
+"""
+import argparse
+import json
+import os
+import random
+
+from common import QUESTIONS, load_app, random_answers, timed
+
+def database_bytes(app, name: str, values) -> int:
+    """Tamanho do banco SQLite com `values` na coluna answers"""
+    storage = app.SQLiteStorage(name)
+    storage.init_schema(lambda: "x")
+    storage.create_survey("Codificação", json.dumps(QUESTIONS))
+    survey_id = storage.get_active_survey()[0]
+    empty = os.path.getsize(name)
+    for start in range(0, len(values), 5000):
+        storage.save_responses_bulk([(survey_id, value, True, None, None, "bench", None, [])
+                                     for value in values[start:start + 5000]])
+    with storage.get_connection() as conn:
+        conn.cursor().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(name) - empty
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--responses", type=int, default=200000)
+    args = parser.parse_args()
+
+    app = load_app()
+    import answers_codec as codec  # o diretório do app entra no sys.path em load_app
+    import csv_export
+    rng = random.Random(1)
+    answers = [random_answers(rng) for _ in range(args.responses)]
+    n = len(answers)
+    closed = [{k: v for k, v in a.items() if QUESTIONS[int(k)]['type'] in ('escala_1_5', 'multipla_escolha')}
+              for a in answers]
+
+    print(f"{n} respostas, {len(QUESTIONS)} perguntas")
+    print("bytes por resposta            JSON   binário  banco JSON  banco binário")
+    for label, rows in (("todas as perguntas", answers), ("sem as de texto", closed)):
+        as_json = [json.dumps(a) for a in rows]
+        as_binary = [codec.encode_answers(QUESTIONS, a) for a in rows]
+        sizes = [sum(len(v.encode('utf-8') if isinstance(v, str) else v) for v in values) / n
+                 for values in (as_json, as_binary)]
+        on_disk = [database_bytes(app, f"{label}-{kind}.db", values) / n
+                   for kind, values in (("json", as_json), ("binario", as_binary))]
+        print(f"{label:<24} {sizes[0]:9.1f} {sizes[1]:9.1f} {on_disk[0]:11.1f} {on_disk[1]:14.1f}")
+
+    as_json = [json.dumps(a) for a in answers]
+    as_binary = [codec.encode_answers(QUESTIONS, a) for a in answers]
+
+    def rate(fn, repeat=3):
+        elapsed, _ = timed(fn, repeat)
+        return f"{elapsed:6.2f}s  {n / elapsed / 1e6:5.2f}M respostas/s"
+
+    print(f"encode_answers:               {rate(lambda: [codec.encode_answers(QUESTIONS, a) for a in answers])}")
+    print(f"json.dumps:                   {rate(lambda: [json.dumps(a) for a in answers])}")
+    print(f"decode_answers, JSON:         {rate(lambda: [codec.decode_answers(QUESTIONS, v) for v in as_json])}")
+    print(f"decode_answers, binário:      {rate(lambda: [codec.decode_answers(QUESTIONS, v) for v in as_binary])}")
+    print(f"decode_many, JSON:            {rate(lambda: codec.decode_many(QUESTIONS, as_json))}")
+    print(f"decode_many, binário:         {rate(lambda: codec.decode_many(QUESTIONS, as_binary))}")
+    decode = codec.row_decoder(QUESTIONS)
+    print(f"row_decoder, JSON:            {rate(lambda: [decode(v) for v in as_json])}")
+    print(f"row_decoder, binário:         {rate(lambda: [decode(v) for v in as_binary])}")
+    for label, values in (("JSON", as_json), ("binário", as_binary)):
+        rows = [(j, "2024-01-01 00:00:00", value, True, None, None) for j, value in enumerate(values)]
+        print(f"format_rows, {label + ':':<17}{rate(lambda: csv_export.format_rows(QUESTIONS, rows))}")
+    batch = app.REPORT_BATCH_SIZE
+    for label, values in (("JSON", as_json), ("binário", as_binary)):
+        columns = lambda: [codec.decode_columns(QUESTIONS, values[start:start + batch], {})
+                           for start in range(0, n, batch)]
+        print(f"decode_columns, {label + ':':<14}{rate(columns)}")
+
+if __name__ == "__main__":
+    main()
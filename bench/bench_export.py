@@ -0,0 +1,51 @@
+"""Benchmark da exportação CSV: sequencial x blocos paralelos no pool de processos.
+
+Uso: python bench/bench_export.py [--responses 1000000] [--workers 4]
+
+A exportação paralela é medida com o pool já iniciado (como num servidor em execução).
+"""
+import argparse
+import json
+import os
+import time
+
+from common import QUESTIONS, fill_survey, load_app, timed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--responses", type=int, default=1000000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    app = load_app()
+    storage = app.SQLiteStorage("bench.db")
+    storage.init_schema(lambda: "x")
+    storage.create_survey("Exportação", json.dumps(QUESTIONS))
+    survey_id = storage.get_active_survey()[0]
+    started = time.perf_counter()
+    fill_survey(app, storage, survey_id, args.responses, search=False)
+    print(f"{args.responses} respostas: carga em {time.perf_counter() - started:.0f}s, "
+          f"{os.cpu_count()} CPUs")
+
+    # Fora do Streamlit: a exportação usa este backend e um cache de contadores próprio
+    app.get_storage = lambda: storage
+    counters = app.CountersCache(storage)
+    app.get_counters = lambda: counters
+
+    app.EXPORT_WORKERS = 1
+    sequential, data = timed(lambda: app.export_responses_to_csv(survey_id), repeat=3)
+    print(f"sequencial:             {sequential:6.2f}s  {len(data) / 1e6:.0f} MB")
+
+    app.EXPORT_WORKERS = args.workers
+    app.export_responses_to_csv(survey_id)  # inicia os processos do pool
+    cpu = time.process_time()
+    parallel, parallel_data = timed(lambda: app.export_responses_to_csv(survey_id), repeat=3)
+    cpu = (time.process_time() - cpu) / 3
+    assert parallel_data == data
+    # CPU do processo do app: o que sobra para atender os outros usuários durante a exportação
+    print(f"paralelo ({args.workers} processos): {parallel:6.2f}s  {sequential / parallel:.2f}x, "
+          f"CPU do app {cpu:.2f}s")
+    app.get_export_pool().shutdown()
+
+if __name__ == "__main__":
+    main()
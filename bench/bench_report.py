@@ -0,0 +1,55 @@
+"""Benchmark do relatório por pesquisa.
+
+Uso: python bench/bench_report.py [--responses 1000000] [--new 1000]
+
+Mede o relatório completo (leitura, decodificação e estatísticas) com o cache de colunas vazio,
+depois de chegarem --new respostas (só as novas são lidas) e a decodificação isolada.
+"""
+import argparse
+import json
+import time
+
+from common import QUESTIONS, fill_survey, load_app, timed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--responses", type=int, default=1000000)
+    parser.add_argument("--new", type=int, default=1000)
+    args = parser.parse_args()
+
+    app = load_app()
+    storage = app.SQLiteStorage("bench.db")
+    storage.init_schema(lambda: "x")
+    storage.create_survey("Relatório", json.dumps(QUESTIONS))
+    survey_id = storage.get_active_survey()[0]
+    started = time.perf_counter()
+    fill_survey(app, storage, survey_id, args.responses, search=False)
+    print(f"{args.responses} respostas: carga em {time.perf_counter() - started:.0f}s")
+
+    app.get_storage = lambda: storage
+    versions = iter(range(1, 1000))  # versão nova a cada chamada: sem o cache do st.cache_data
+
+    def cold():
+        app.get_report_cache.clear()
+        return app.build_report(survey_id, next(versions))
+
+    elapsed, report = timed(cold, repeat=3)
+    assert report['total'] == args.responses
+    print(f"relatório, cache vazio:          {elapsed:6.2f}s")
+
+    fill_survey(app, storage, survey_id, args.new, seed=2, search=False)
+    started = time.perf_counter()
+    report = app.build_report(survey_id, next(versions))
+    assert report['total'] == args.responses + args.new
+    print(f"relatório, +{args.new} respostas:  {time.perf_counter() - started:6.2f}s")
+
+    values = [row[2] for row in storage.iter_responses(survey_id)]
+    batch = app.REPORT_BATCH_SIZE
+    elapsed, _ = timed(lambda: [app.decode_columns(QUESTIONS, values[start:start + batch], {})
+                                for start in range(0, len(values), batch)], repeat=3)
+    print(f"decode_columns:                  {elapsed:6.2f}s  {len(values) / elapsed / 1e6:.1f}M respostas/s")
+    elapsed, _ = timed(lambda: [app.decode_answers(QUESTIONS, v) for v in values], repeat=1)
+    print(f"decode_answers linha a linha:    {elapsed:6.2f}s  {len(values) / elapsed / 1e6:.1f}M respostas/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Benchmark da busca nas respostas de texto (SQLite FTS5).
+
+Uso: python bench/bench_search.py [--responses 500000] [--surveys 10]
+
+As respostas são divididas entre várias pesquisas e a busca é feita em uma delas, como no painel.
+"""
+import argparse
+import json
+import os
+import time
+
+from common import QUESTIONS, fill_survey, load_app, timed
+
+QUERIES = ["atendimento", "entrega prazo", "turma", "nota turma", "inexistente"]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--responses", type=int, default=500000)
+    parser.add_argument("--surveys", type=int, default=10)
+    args = parser.parse_args()
+
+    app = load_app()
+    storage = app.SQLiteStorage("bench.db")
+    storage.init_schema(lambda: "x")
+    started = time.perf_counter()
+    for i in range(args.surveys):
+        storage.create_survey(f"Pesquisa {i}", json.dumps(QUESTIONS))
+        fill_survey(app, storage, storage.get_active_survey()[0], args.responses // args.surveys, seed=i)
+    print(f"{args.responses} respostas em {args.surveys} pesquisas: carga em {time.perf_counter() - started:.0f}s, "
+          f"banco {os.path.getsize('bench.db') / 1e6:.0f} MB")
+
+    survey_id = storage.get_active_survey()[0]
+    print(f"{'consulta':<16} {'total':>8} {'página 1':>10} {'página 10':>10}")
+    for query in QUERIES:
+        first, (total, _) = timed(lambda: storage.search_answers(survey_id, query, app.SEARCH_PAGE_SIZE, 0))
+        tenth, _ = timed(lambda: storage.search_answers(survey_id, query, app.SEARCH_PAGE_SIZE,
+                                                        9 * app.SEARCH_PAGE_SIZE))
+        print(f"{query:<16} {total:>8} {first * 1000:>8.1f}ms {tenth * 1000:>8.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark de escala horizontal: envios por segundo com 1..N processos sobre o mesmo banco.
+
+Uso: python bench/bench_submit_scaling.py [--max-workers 4] [--sessions 32] [--seconds 5] [--direct]
+
+Cada processo faz o que um worker do cluster.py faz por respondente (rate limit de início,
+pesquisa ativa, submit_response) em várias threads, com o seu próprio log de envio rápido.
+--direct desativa o envio rápido (FAST_SUBMIT=0, gravação direta no banco).
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+from common import QUESTIONS, load_app, random_answers
+
+def worker(workdir: str, index: int, sessions: int, seconds: float, direct: bool, barrier, results):
+    os.environ["RESPONSE_LOG"] = f"responses-{index}.log"
+    os.environ["FAST_SUBMIT"] = "0" if direct else "1"
+    app = load_app(workdir)
+    app.init_database()
+    log = None if direct else app.get_response_log()
+    counts = [0] * sessions
+    barrier.wait()
+    deadline = time.perf_counter() + seconds
+
+    def session(slot: int):
+        rng = random.Random(index * 1000 + slot)
+        while time.perf_counter() < deadline:
+            session_id = f"{index}-{slot}-{counts[slot]}"
+            assert app.check_rate_limit(session_id, "survey_start", max_requests=5)
+            survey = app.get_active_survey()
+            assert app.submit_response(survey, random_answers(rng), True) == []
+            counts[slot] += 1
+
+    threads = [threading.Thread(target=session, args=(slot,)) for slot in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(sum(counts))
+    # Esperar o log chegar ao banco antes da próxima rodada (fora da medição)
+    while log and log.pending_bytes():
+        time.sleep(0.1)
+
+def run(workdir: str, workers: int, args) -> float:
+    ctx = multiprocessing.get_context("spawn")
+    barrier, results = ctx.Barrier(workers + 1), ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(workdir, i, args.sessions, args.seconds, args.direct,
+                                                  barrier, results))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    barrier.wait()  # todos importaram o app e abriram o banco
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total / args.seconds
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--direct", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pesquisa-bench-")
+    app = load_app(workdir)
+    app.init_database()
+    app.create_survey("Escala", QUESTIONS)
+
+    print(f"{os.cpu_count()} CPUs, {args.sessions} sessões por processo, "
+          f"{'gravação direta' if args.direct else 'envio rápido'}")
+    print(f"{'processos':>9} {'envios/s':>10} {'escala':>8}")
+    base = None
+    for workers in range(1, args.max_workers + 1):
+        rate = run(workdir, workers, args)
+        base = base or rate
+        print(f"{workers:>9} {rate:>10.0f} {rate / base:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
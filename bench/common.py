@@ -0,0 +1,65 @@
+"""Utilitários dos benchmarks: o app é importado em modo "bare" (sem servidor Streamlit)."""
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = (
+    [{'text': f'Escala {i}', 'type': 'escala_1_5', 'required': True} for i in range(10)] +
+    [{'text': f'Opção {i}', 'type': 'multipla_escolha', 'required': True,
+      'options': ['Sim', 'Não', 'Talvez', 'Não sei']} for i in range(5)] +
+    [{'text': f'Texto {i}', 'type': 'texto_curto', 'required': False} for i in range(4)] +
+    [{'text': 'Comentários', 'type': 'texto_longo', 'required': False, 'is_final': True, 'max_chars': 2000}]
+)
+
+WORDS = ("atendimento entrega prazo produto qualidade preço suporte equipe rápido demora "
+         "excelente ruim ótimo satisfeito problema solução melhoria sistema aplicativo site "
+         "pagamento cadastro senha acesso professor aula conteúdo material prova nota turma").split()
+
+def load_app(workdir: str = None):
+    """Importa app.py com o diretório de trabalho em workdir (o app abre survey.db ao ser importado)"""
+    os.chdir(workdir or tempfile.mkdtemp(prefix="pesquisa-bench-"))
+    sys.path.insert(0, ROOT)
+    logging.disable(logging.WARNING)  # avisos de "missing ScriptRunContext" do modo bare
+    import app
+    return app
+
+def random_text(rng: random.Random, words: int) -> str:
+    # Distribuição de Zipf: poucos termos muito frequentes, muitos raros
+    return " ".join(WORDS[min(int(rng.paretovariate(1.2)) - 1, len(WORDS) - 1)] for _ in range(words))
+
+def random_answers(rng: random.Random, questions=QUESTIONS) -> dict:
+    answers = {}
+    for i, q in enumerate(questions):
+        if q['type'] == 'escala_1_5':
+            answers[str(i)] = rng.randint(1, 5)
+        elif q['type'] == 'multipla_escolha':
+            answers[str(i)] = rng.choice(q['options'])
+        elif rng.random() < 0.6:
+            answers[str(i)] = random_text(rng, rng.randint(3, 12 if q['type'] == 'texto_curto' else 40))
+    return answers
+
+def fill_survey(app, storage, survey_id: int, count: int, seed: int = 1, batch: int = 5000, search: bool = True):
+    """Grava `count` respostas aleatórias em lotes (search=False pula o índice de busca, mais rápido)"""
+    rng = random.Random(seed)
+    for start in range(0, count, batch):
+        rows = []
+        for _ in range(min(batch, count - start)):
+            answers = random_answers(rng)
+            rows.append((survey_id, storage.encode_answers(QUESTIONS, answers), rng.random() < 0.7,
+                         None, None, "bench", None, app.text_answers(QUESTIONS, answers) if search else []))
+        storage.save_responses_bulk(rows)
+
+def timed(fn, repeat: int = 5):
+    """Executa fn `repeat` vezes; retorna (mediana em segundos, último resultado)"""
+    times, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), result
@@ -0,0 +1,53 @@
+"""Executa vários workers Streamlit do app.py, um por porta, para uso atrás de um proxy reverso.
+
+O estado compartilhado entre os workers (pesquisa ativa, rate limits, contadores e
+respostas) fica no banco; o proxy deve usar sessões fixas (ver README).
+
+Uso: python cluster.py --workers 4 --base-port 8501
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description="Pesquisa App em modo multi-processo")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", os.cpu_count() or 2)))
+    parser.add_argument("--base-port", type=int, default=int(os.getenv("BASE_PORT", 8501)))
+    parser.add_argument("--address", default="127.0.0.1")
+    args = parser.parse_args()
+    
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    workers = []
+    for i in range(args.workers):
+        port = args.base_port + i
+        # Cada worker precisa do seu próprio log de envio rápido
+        env = dict(os.environ, RESPONSE_LOG=f"responses-{port}.log")
+        workers.append(subprocess.Popen([
+            sys.executable, "-m", "streamlit", "run", app_path,
+            "--server.port", str(port),
+            "--server.address", args.address,
+            "--server.headless", "true",
+        ], env=env))
+        print(f"Worker {i + 1} em http://{args.address}:{port}")
+    
+    def stop(*_):
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+        sys.exit(0)
+    
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    
+    # Encerrar tudo se algum worker cair
+    while all(worker.poll() is None for worker in workers):
+        time.sleep(1)
+    print("Um worker terminou inesperadamente; encerrando os demais.")
+    stop()
+
+if __name__ == "__main__":
+    main()
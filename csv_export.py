@@ -0,0 +1,55 @@
+"""Formatação das respostas em CSV.
+
+Módulo sem dependência do Streamlit: é importado pelos processos do pool de exportação.
+"""
+import csv
+import io
+import sqlite3
+from typing import Any, Dict, List, Tuple
+
+from answers_codec import row_decoder
+
+def csv_header(questions: List[Dict]) -> str:
+    """Linha de cabeçalho: metadados da resposta seguidos de uma coluna por pergunta"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(['ID', 'Data/Hora', 'Anônimo', 'Nome', 'Email'] +
+                    [f"Q{i+1}: {q['text'][:50]}" for i, q in enumerate(questions)])
+    return buffer.getvalue()
+
+def format_rows(questions: List[Dict], rows: List[Tuple]) -> str:
+    """Formata linhas (id, submitted_at, answers, is_anonymous, nome, email) em CSV"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    decode = row_decoder(questions)
+    writer.writerows([resp[0], resp[1], 'Sim' if resp[3] else 'Não', resp[4] or '', resp[5] or ''] + decode(resp[2])
+                     for resp in rows)
+    return buffer.getvalue()
+
+RANGE_QUERY = """
+    SELECT id, submitted_at, answers, is_anonymous, respondent_name, respondent_email
+    FROM responses WHERE survey_id = ? AND id BETWEEN ? AND ?
+    ORDER BY id
+"""
+
+_connections: Dict[Tuple[str, str], Any] = {}
+
+def _connect(source: Tuple[str, str]):
+    """Conexão do processo do pool, reaproveitada entre blocos; source vem de storage.export_source()"""
+    if source not in _connections:
+        kind, target = source
+        if kind == 'sqlite':
+            _connections[source] = sqlite3.connect(target, timeout=30)
+        else:
+            import psycopg2
+            conn = psycopg2.connect(target, client_encoding='UTF8')
+            conn.autocommit = True  # cada bloco é uma leitura avulsa: nada fica "idle in transaction"
+            _connections[source] = conn
+    return _connections[source]
+
+def export_range(source: Tuple[str, str], questions: List[Dict], survey_id: int, first_id: int, last_id: int) -> bytes:
+    """Lê e formata uma faixa de IDs no próprio processo do pool: só o CSV pronto volta ao app"""
+    c = _connect(source).cursor()
+    c.execute(RANGE_QUERY if source[0] == 'sqlite' else RANGE_QUERY.replace('?', '%s'),
+              (survey_id, first_id, last_id))
+    return format_rows(questions, c.fetchall()).encode('utf-8')
@@ -0,0 +1,103 @@
+"""Fixtures dos testes: o app é importado em modo "bare" (sem servidor Streamlit).
+
+Os testes de PostgreSQL usam TEST_DATABASE_URL, se definido, ou um cluster temporário
+criado com initdb (encontrado no PATH ou em PG_BIN). Sem nenhum dos dois, são pulados.
+"""
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Ao ser importado, o app abre survey.db no diretório atual
+os.chdir(tempfile.mkdtemp(prefix="pesquisa-tests-"))
+
+import app  # noqa: E402
+
+QUESTIONS = [
+    {'text': 'Nota', 'type': 'escala_1_5', 'required': True},
+    {'text': 'Turno', 'type': 'multipla_escolha', 'options': ['Manhã', 'Tarde'], 'required': True},
+    {'text': 'Comentário', 'type': 'texto_longo', 'required': False, 'max_chars': 2000},
+]
+
+def _pg_binary(name: str):
+    bindir = os.getenv("PG_BIN")
+    return os.path.join(bindir, name) if bindir else shutil.which(name)
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture(scope="session")
+def postgres_server(tmp_path_factory):
+    """DSN de administração do servidor de testes"""
+    if app.psycopg2 is None:
+        pytest.skip("psycopg2 não instalado")
+    if os.getenv("TEST_DATABASE_URL"):
+        yield os.environ["TEST_DATABASE_URL"]
+        return
+    initdb, pg_ctl = _pg_binary("initdb"), _pg_binary("pg_ctl")
+    if not initdb or not os.path.exists(initdb):
+        pytest.skip("initdb não encontrado (defina PG_BIN ou TEST_DATABASE_URL)")
+    if os.geteuid() == 0:
+        pytest.skip("o PostgreSQL não roda como root (defina TEST_DATABASE_URL)")
+
+    base = tmp_path_factory.mktemp("pg")
+    data, port = base / "data", _free_port()
+    subprocess.run([initdb, "-D", str(data), "-U", "postgres", "-A", "trust", "-E", "UTF8",
+                    "--locale=C", "--no-sync"],
+                   check=True, capture_output=True)
+    subprocess.run([pg_ctl, "-D", str(data), "-l", str(base / "log"), "-w", "start",
+                    "-o", f"-k {base} -p {port} -c listen_addresses= -c fsync=off"],
+                   check=True, capture_output=True)
+    try:
+        yield f"postgresql://postgres@/postgres?host={base}&port={port}"
+    finally:
+        subprocess.run([pg_ctl, "-D", str(data), "-m", "fast", "stop"], capture_output=True)
+
+def _admin_execute(dsn: str, sql: str):
+    conn = app.psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        conn.cursor().execute(sql)
+    finally:
+        conn.close()
+
+@pytest.fixture
+def postgres_dsn(request, postgres_server):
+    """Banco novo e vazio para cada teste"""
+    name = f"pesquisa_{uuid.uuid4().hex[:12]}"
+    _admin_execute(postgres_server, f"CREATE DATABASE {name} ENCODING 'UTF8' TEMPLATE template0")
+    request.addfinalizer(lambda: _admin_execute(postgres_server, f"DROP DATABASE {name} WITH (FORCE)"))
+    return app.psycopg2.extensions.make_dsn(postgres_server, dbname=name)
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def make_storage(request, tmp_path):
+    """Fábrica de instâncias do backend sobre o mesmo banco (simula processos distintos)"""
+    if request.param == "sqlite":
+        path = str(tmp_path / "survey.db")
+        factory = lambda **kw: app.SQLiteStorage(path, **kw)
+    else:
+        dsn = request.getfixturevalue("postgres_dsn")
+        factory = lambda **kw: app.PostgresStorage(dsn, **kw)
+
+    created = []
+    def make(**kw):
+        storage = factory(**kw)
+        storage.init_schema(lambda: "hash-padrao")
+        created.append(storage)
+        return storage
+    yield make
+    for storage in created:
+        if isinstance(storage, app.PostgresStorage):
+            storage.close()
+
+@pytest.fixture
+def storage(make_storage):
+    return make_storage()
@@ -0,0 +1,51 @@
+"""Cotas do controle de admissão: contagens em memória, lidas do banco e do log fora dos locks."""
+import threading
+import time
+
+import app
+from test_response_log import entry, open_log, wait_until
+from test_storage import ANSWERS, create_survey
+
+def test_stored_count_is_exact_during_replay(storage, tmp_path, monkeypatch):
+    survey_id = create_survey(storage)
+    save_responses_bulk = storage.save_responses_bulk
+    def slow_save(rows, state=None):
+        seq = save_responses_bulk(rows, state)
+        time.sleep(0.2)  # linhas no banco e ainda pendentes no log
+        return seq
+    monkeypatch.setattr(storage, "save_responses_bulk", slow_save)
+
+    log = open_log(tmp_path / "responses.log", storage)
+    admission = app.AdmissionController(log.counters, log, 0)
+    for answers in ANSWERS:
+        log.append(entry(survey_id, answers))
+    deadline = time.time() + 2
+    while time.time() < deadline:
+        assert admission.stored(survey_id) == len(ANSWERS)
+    wait_until(lambda: log.pending_bytes() == 0)
+    assert admission.stored(survey_id) == len(ANSWERS)
+
+def test_quota_does_not_wait_for_counters_lock(storage, tmp_path, monkeypatch):
+    survey_id = create_survey(storage)
+    survey = {'id': survey_id, 'max_responses': 2}
+    log = open_log(tmp_path / "responses.log", storage)
+    admission = app.AdmissionController(log.counters, log, 0)
+    log.append(entry(survey_id, ANSWERS[0]))
+    assert admission.used(survey_id) == 1
+
+    # Replay segurando o lock dos contadores: as cotas seguem em memória
+    results = []
+    def submit():
+        results.append(admission.reserve(survey))
+        admission.confirm(survey, True)
+        results.append((admission.used(survey_id), admission.reserve(survey)))
+    with log.counters.lock:
+        thread = threading.Thread(target=submit)
+        thread.start()
+        thread.join(timeout=5)
+    assert results == [True, (2, False)]
+
+    # Releitura: a resposta confirmada passa a vir do log, sem contar em dobro
+    monkeypatch.setattr(app, "QUOTA_SYNC_INTERVAL", 0)
+    log.append(entry(survey_id, ANSWERS[1]))
+    assert admission.used(survey_id) == 2
@@ -0,0 +1,91 @@
+"""CountersCache: deltas locais, escritas de outros processos e lock fora das consultas."""
+import threading
+
+import app
+from conftest import QUESTIONS
+from test_storage import ANSWERS, create_survey
+
+def save(storage, survey_id, is_anonymous=True) -> int:
+    return storage.save_response(survey_id, storage.encode_answers(QUESTIONS, ANSWERS[1]), is_anonymous,
+                                 None, None, "sessao")
+
+def test_local_writes_update_cache(storage):
+    counters = app.CountersCache(storage)
+    survey_id = create_survey(storage)
+    assert counters.survey_counts(survey_id) == (0, 0)
+    assert counters.get_totals() == (1, 0)
+
+    counters.record(save(storage, survey_id, is_anonymous=False), [(survey_id, False)])
+    counters.record(storage.check_rate_limit("s1", "survey_start", 5, 300), rate_limits=1)
+    assert counters.cached_survey_counts(survey_id) == (1, 0)
+    assert counters.survey_counts(survey_id) == (1, 0)
+    assert counters.get_totals() == (1, 1)
+    assert counters.recent_rate_limits() == 1
+
+def test_foreign_write_between_commit_and_record(make_storage):
+    storage, other = make_storage(), make_storage()
+    counters = app.CountersCache(storage)
+    survey_id = create_survey(storage)
+    assert counters.survey_counts(survey_id) == (0, 0)
+
+    seq = save(storage, survey_id)
+    save(other, survey_id)  # outro processo confirma antes de o delta local ser aplicado
+    counters.record(seq, [(survey_id, True)])
+    assert counters.survey_counts(survey_id) == (2, 2)
+
+def test_foreign_write_before_local_write(make_storage):
+    storage, other = make_storage(), make_storage()
+    counters = app.CountersCache(storage)
+    survey_id = create_survey(storage)
+    assert counters.survey_counts(survey_id) == (0, 0)
+
+    save(other, survey_id)
+    counters.record(save(storage, survey_id), [(survey_id, True)])
+    assert counters.survey_counts(survey_id) == (2, 2)
+
+def test_foreign_write_detected_on_read(make_storage):
+    storage, other = make_storage(), make_storage()
+    counters = app.CountersCache(storage)
+    survey_id = create_survey(storage)
+    assert counters.get_totals() == (1, 0)
+    save(other, survey_id)
+    assert counters.get_totals() == (1, 1)
+    assert counters.survey_counts(survey_id) == (1, 1)
+
+def test_out_of_order_local_records(storage):
+    counters = app.CountersCache(storage)
+    survey_id = create_survey(storage)
+    assert counters.survey_counts(survey_id) == (0, 0)
+    first, second = save(storage, survey_id), save(storage, survey_id)
+    counters.record(second, [(survey_id, True)])
+    counters.record(first, [(survey_id, True)])
+    assert counters.survey_counts(survey_id) == (2, 2)
+
+def test_lock_not_held_during_queries(storage):
+    counters = app.CountersCache(storage)
+    survey_id = create_survey(storage)
+    query, data_version = storage.survey_counts, storage.data_version
+    acquired = []
+
+    def probe():
+        if counters.lock.acquire(timeout=1):
+            acquired.append(True)
+            counters.lock.release()
+
+    def survey_counts(survey_id):
+        # Outra thread consegue o lock enquanto a consulta está em andamento
+        thread = threading.Thread(target=probe)
+        thread.start()
+        thread.join()
+        return query(survey_id)
+
+    def probed_data_version():
+        thread = threading.Thread(target=probe)
+        thread.start()
+        thread.join()
+        return data_version()
+
+    storage.survey_counts = survey_counts
+    storage.data_version = probed_data_version
+    assert counters.survey_counts(survey_id) == (0, 0)
+    assert acquired == [True, True]
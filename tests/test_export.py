@@ -0,0 +1,51 @@
+"""Exportação CSV: blocos paralelos lidos pelos processos do pool e recuperação de um pool quebrado."""
+import os
+
+import app
+from answers_codec import decode_answers, encode_answers, row_decoder
+from conftest import QUESTIONS
+from test_storage import ANSWERS, create_survey, save
+
+def parallel_export(storage, monkeypatch):
+    survey_id = create_survey(storage)
+    for i in range(7):
+        save(storage, survey_id, ANSWERS[i % len(ANSWERS)])
+    monkeypatch.setattr(app, "get_storage", lambda: storage)
+    monkeypatch.setattr(app, "get_counters", lambda: app.CountersCache(storage))
+    expected = app.export_responses_to_csv(survey_id)
+    monkeypatch.setattr(app, "EXPORT_WORKERS", 2)
+    monkeypatch.setattr(app, "EXPORT_CHUNK_SIZE", 2)
+    return survey_id, expected
+
+def test_parallel_export_matches_sequential(storage, monkeypatch):
+    survey_id, expected = parallel_export(storage, monkeypatch)
+    try:
+        assert app.export_responses_to_csv(survey_id) == expected
+        assert expected.decode('utf-8').count("\n") == 8
+    finally:
+        app.get_export_pool().shutdown()
+        app.get_export_pool.clear()
+
+def test_broken_export_pool_is_replaced(storage, monkeypatch):
+    survey_id, expected = parallel_export(storage, monkeypatch)
+    broken = app.get_export_pool()
+    try:
+        broken.submit(os._exit, 1).exception()
+        assert app.export_responses_to_csv(survey_id) == expected
+        assert app.get_export_pool() is not broken
+    finally:
+        app.get_export_pool().shutdown()
+        app.get_export_pool.clear()
+
+def test_row_decoder_matches_decode_answers():
+    questions = [{'text': 'Apelido', 'type': 'texto_curto'}] + QUESTIONS + [QUESTIONS[0]]
+    values = [encode_answers(questions, answers) for answers in (
+        {'1': 4, '2': 'Tarde', '4': 1},
+        {'0': 'Zé', '1': 5, '2': 'Noite', '3': 'ção ' * 100},  # opção fora da lista; varint de 2 bytes
+        {},
+        {'9': 'pergunta inexistente'},  # fallback em JSON gravado como bytes
+    )] + [app.json.dumps({'0': 'antigo', '1': 3})]
+    decode = row_decoder(questions)
+    for value in values:
+        answers = decode_answers(questions, value)
+        assert decode(value) == [answers.get(str(i), '') for i in range(len(questions))]
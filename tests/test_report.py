@@ -0,0 +1,60 @@
+"""Relatório: colunas decodificadas em lote e cache incremental por pesquisa."""
+import numpy as np
+
+import app
+from conftest import QUESTIONS
+from test_storage import ANSWERS, create_survey, save
+
+def test_report_from_binary_and_json_rows(storage, monkeypatch):
+    survey_id = create_survey(storage)
+    for answers in ANSWERS:
+        save(storage, survey_id, answers, is_anonymous=answers is not ANSWERS[2])
+    # Linha antiga em JSON, com opção fora da lista
+    storage.save_response(survey_id, app.json.dumps({'0': 3, '1': 'Noite', '2': 'ótimo'}), True, None, None, "sessao")
+    monkeypatch.setattr(app, "get_storage", lambda: storage)
+    monkeypatch.setattr(app, "get_report_cache", app.ReportCache)
+
+    report = app.build_report(survey_id, id(storage))
+    assert (report['total'], report['anonymous']) == (4, 3)
+    assert report['timeline'].sum() == 4
+    scale, option, text = report['questions']
+    assert scale['stats'].round(2).tolist() == [4, 3.5, 3.5, 1.29]
+    assert scale['distribution'].tolist() == [0, 1, 1, 1, 1]
+    assert option['distribution'].to_dict() == {'Manhã': 1, 'Tarde': 2, 'Noite': 1}
+    assert text['stats'].round(2).tolist() == [3, 20.67, 20, 37]
+    assert text['distribution'].to_dict() == {'5-15': 1, '15-26': 1, '26-37': 1}
+    assert text['by_identity'].tolist() == [2, 1]
+
+def test_summarize_counts_matches_numpy():
+    values = np.array([1, 1, 2, 5, 5, 5, 4])
+    n, mean, median, std = app.summarize_counts(np.bincount(values))
+    assert (n, mean, median) == (7, values.mean(), np.median(values))
+    assert np.isclose(std, values.std(ddof=1))
+    assert app.summarize_counts(np.bincount(values[:4]))[2] == 1.5
+
+def test_report_cache_reads_only_new_rows(storage):
+    survey_id = create_survey(storage)
+    other = create_survey(storage, "Outra")
+    save(storage, survey_id, ANSWERS[0])
+    save(storage, other, ANSWERS[1])
+    cache = app.ReportCache()
+    first = cache.load(storage, survey_id, QUESTIONS)
+    assert len(first.is_anonymous) == 1
+
+    save(storage, survey_id, ANSWERS[2])
+    calls = []
+    iter_report_rows = storage.iter_report_rows
+    storage.iter_report_rows = lambda survey_id, after_id: calls.append(after_id) or iter_report_rows(survey_id, after_id)
+    second = cache.load(storage, survey_id, QUESTIONS)
+    assert calls == [first.last_id]
+    assert np.array_equal(second.columns[0], [5, 4])
+    assert second.columns[0].dtype == np.uint8
+
+    # Resposta de ID menor que aparece depois (commit fora de ordem): a pesquisa é relida
+    with storage.get_connection() as conn:
+        conn.cursor().execute(storage._sql("UPDATE responses SET survey_id = ? WHERE survey_id = ?"),
+                              (survey_id, other))
+        conn.commit()
+    third = cache.load(storage, survey_id, QUESTIONS)
+    assert calls == [first.last_id, second.last_id, 0]
+    assert np.array_equal(third.columns[0], [5, 2, 4])
@@ -0,0 +1,99 @@
+"""Log do envio rápido: segmentos, recuperação ao reiniciar e falhas de disco."""
+import errno
+import time
+
+import pytest
+
+import app
+from conftest import QUESTIONS
+from test_storage import ANSWERS, create_survey
+
+def entry(survey_id, answers):
+    return {'survey_id': survey_id, 'answers': app.json.dumps(answers), 'is_anonymous': True,
+            'name': None, 'email': None, 'session_id': "sessao", 'submitted_at': "2030-01-01 00:00:00",
+            'texts': app.text_answers(QUESTIONS, answers)}
+
+def open_log(path, storage):
+    return app.ResponseLog(str(path), storage, app.CountersCache(storage), app.ResponseFeed())
+
+def wait_until(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "tempo esgotado"
+        time.sleep(0.02)
+
+def replayed(storage, survey_id):
+    return storage.survey_counts(survey_id)[0]
+
+def test_segments_are_replayed_and_removed_after_a_failed_state_write(storage, tmp_path, monkeypatch):
+    survey_id = create_survey(storage)
+    monkeypatch.setattr(app, "LOG_ROTATE_BYTES", 300)
+    set_state = storage.set_state
+    calls = []
+    def flaky_set_state(key, value):
+        calls.append(value)
+        if len(calls) == 1:
+            raise RuntimeError("banco indisponível")
+        set_state(key, value)
+    monkeypatch.setattr(storage, "set_state", flaky_set_state)
+
+    log = open_log(tmp_path / "responses.log", storage)
+    for i in range(12):
+        log.append(entry(survey_id, ANSWERS[i % len(ANSWERS)]))
+    assert log.write_segment > 0
+    wait_until(lambda: replayed(storage, survey_id) == 12 and log.pending_bytes() == 0
+               and log._segments() == [log.write_segment])
+    # A passagem que falhou foi repetida: nenhum segmento apagado antes de registrado no banco
+    assert calls[0] == calls[1] == log.SEGMENT_SPAN
+    assert storage.get_state(log.state_key) == log.segment * log.SEGMENT_SPAN + log.offset
+    assert log.pending == {survey_id: 0}
+
+def test_legacy_log_resumes_from_saved_offset(storage, tmp_path):
+    survey_id = create_survey(storage)
+    path = tmp_path / "responses.log"
+    lines = [(app.json.dumps(entry(survey_id, answers)) + "\n").encode('utf-8') for answers in ANSWERS[:2]]
+    path.write_bytes(b"".join(lines) + b'{"survey_id": ')  # última linha interrompida por uma queda
+    storage.set_state(f"response_log_offset:{path}", len(lines[0]))
+
+    log = open_log(path, storage)
+    assert log.pending == {survey_id: 1}
+    wait_until(lambda: replayed(storage, survey_id) == 1)
+    assert not path.exists()
+    assert (tmp_path / "responses.log.0").read_bytes() == b"".join(lines)
+
+def test_fsync_failure_makes_append_raise_and_submit_fall_back(storage, tmp_path, monkeypatch):
+    survey_id = create_survey(storage)
+    log = open_log(tmp_path / "responses.log", storage)
+    def failing_fsync(fd):
+        raise OSError(errno.EIO, "erro de E/S")
+    monkeypatch.setattr(app.os, "fsync", failing_fsync)
+
+    with pytest.raises(OSError):
+        log.append(entry(survey_id, ANSWERS[0]))
+    assert log.error is not None
+    assert log.pending == {survey_id: 0}
+    assert log.pending_bytes() == 0  # linha sem fsync descartada: não é reaplicada depois
+
+    saved = []
+    monkeypatch.setattr(app, "FAST_SUBMIT", True)
+    monkeypatch.setattr(app, "get_response_log", lambda: log)
+    monkeypatch.setattr(app, "get_admission", lambda: app.AdmissionController(log.counters, log, 0))
+    monkeypatch.setattr(app, "save_response", lambda *args: saved.append(args))
+    survey = {'id': survey_id, 'questions': QUESTIONS, 'max_responses': None}
+    assert app.submit_response(survey, ANSWERS[1], True) == []
+    assert saved == [(survey_id, ANSWERS[1], True, None, None)]
+
+def test_second_instance_on_same_path_is_refused(storage, tmp_path):
+    survey_id = create_survey(storage)
+    owner = open_log(tmp_path / "responses.log", storage)
+    other = open_log(tmp_path / "responses.log", storage)
+    assert owner.error is None and other.error is not None
+    with pytest.raises(OSError):
+        other.append(entry(survey_id, ANSWERS[0]))
+    assert other.pending_bytes() == 0
+
+    for answers in ANSWERS:
+        owner.append(entry(survey_id, answers))
+    wait_until(lambda: owner.pending_bytes() == 0)
+    time.sleep(2 * app.LOG_REPLAY_INTERVAL)  # a segunda instância não pode reaplicar nada
+    assert replayed(storage, survey_id) == len(ANSWERS)
@@ -0,0 +1,223 @@
+"""Conformidade dos backends de armazenamento: os mesmos testes rodam no SQLite e no PostgreSQL."""
+import threading
+
+import pytest
+
+import app
+from conftest import QUESTIONS
+
+ANSWERS = [
+    {'0': 5, '1': 'Manhã', '2': 'A entrega foi rápida'},
+    {'0': 2, '1': 'Tarde'},
+    {'0': 4, '1': 'Tarde', '2': 'Atendimento cordial, entrega atrasada'},
+]
+
+def create_survey(storage, title="Pesquisa", **kw) -> int:
+    storage.create_survey(title, app.json.dumps(QUESTIONS), **kw)
+    return storage.get_active_survey()[0]
+
+def save(storage, survey_id, answers, is_anonymous=True, name=None, email=None):
+    storage.save_response(survey_id, storage.encode_answers(QUESTIONS, answers), is_anonymous,
+                          name, email, "sessao", app.text_answers(QUESTIONS, answers))
+
+def test_init_schema_is_idempotent(make_storage, storage):
+    assert storage.get_admin_credentials() == ("hash-padrao", True)
+    make_storage()  # segunda instância sobre o mesmo banco: tabelas e migrações já existem
+    assert storage.get_active_survey() is None
+
+def test_update_admin_password(storage):
+    storage.update_admin_password("novo-hash")
+    assert storage.get_admin_credentials() == ("novo-hash", False)
+
+def test_survey_lifecycle(storage):
+    generation = storage.survey_generation()
+    first = create_survey(storage, "Primeira")
+    second = create_survey(storage, "Segunda", opens_at="2030-01-02 03:04:05", max_responses=10)
+    assert storage.survey_generation() == generation + 2
+
+    survey_id, title, questions, opens_at, closes_at, max_responses = storage.get_active_survey()
+    assert (survey_id, title, closes_at, max_responses) == (second, "Segunda", None, 10)
+    assert app.json.loads(questions) == QUESTIONS
+    assert app.format_utc(app.parse_utc(opens_at)) == "2030-01-02 03:04:05"
+    assert [row[0] for row in storage.list_surveys()] == [second, first]
+    assert storage.get_survey(first)[0] == "Primeira"
+
+    storage.close_survey(second)
+    assert storage.get_active_survey() is None
+    assert storage.survey_generation() == generation + 3
+
+def test_save_response_roundtrip(storage):
+    survey_id = create_survey(storage)
+    save(storage, survey_id, ANSWERS[0])
+    save(storage, survey_id, ANSWERS[1], is_anonymous=False, name="Ana", email="ana@example.com")
+
+    rows = list(storage.iter_responses(survey_id))
+    assert [app.decode_answers(QUESTIONS, row[2]) for row in rows] == ANSWERS[:2]
+    assert [bool(row[3]) for row in rows] == [True, False]
+    assert rows[1][4:] == ("Ana", "ana@example.com")
+    assert storage.survey_counts(survey_id)[:2] == (2, 1)
+    assert storage.get_totals()[:2] == (1, 2)
+
+def test_bulk_save_keeps_timestamps_and_state(storage):
+    survey_id = create_survey(storage)
+    rows = [(survey_id, storage.encode_answers(QUESTIONS, answers), True, None, None, "sessao",
+             f"2024-05-0{i + 1} 10:00:00", app.text_answers(QUESTIONS, answers))
+            for i, answers in enumerate(ANSWERS)]
+    storage.save_responses_bulk(rows, ("offset", 123))
+
+    assert storage.get_state("offset") == 123
+    stored = list(storage.iter_responses(survey_id))
+    assert [str(row[1])[:10] for row in stored] == ["2024-05-01", "2024-05-02", "2024-05-03"]
+    assert [app.decode_answers(QUESTIONS, row[2]) for row in stored] == ANSWERS
+
+    first_id, last_id = storage.response_id_range(survey_id)
+    assert (first_id, last_id) == (stored[0][0], stored[-1][0])
+
+def test_bulk_save_fills_missing_timestamp_and_keeps_empty_strings(storage):
+    survey_id = create_survey(storage)
+    rows = [(survey_id, storage.encode_answers(QUESTIONS, ANSWERS[1]), True, "", None, "sessao", None, []),
+            (survey_id, storage.encode_answers(QUESTIONS, ANSWERS[1]), False, 'Ana "A"', "", "sessao", None, [])]
+    storage.save_responses_bulk(rows)
+
+    stored = list(storage.iter_responses(survey_id))
+    assert all(row[1] is not None for row in stored)
+    assert [row[4:] for row in stored] == [("", None), ('Ana "A"', "")]
+
+def test_state_upsert(storage):
+    assert storage.get_state("chave") is None
+    storage.set_state("chave", 1)
+    storage.set_state("chave", 2 ** 40)
+    assert storage.get_state("chave") == 2 ** 40
+
+def test_rate_limits(storage):
+    assert storage.check_rate_limit("s1", "survey_start", 2, 300)
+    assert storage.check_rate_limit("s1", "survey_start", 2, 300)
+    assert not storage.check_rate_limit("s1", "survey_start", 2, 300)
+    assert storage.check_rate_limit("s2", "survey_start", 2, 300)
+    assert sum(count for _, count in storage.rate_limit_ages(3600)[1]) == 3
+    assert storage.purge_rate_limits(86400) == 0
+
+def test_search_is_scoped_ranked_and_paginated(storage):
+    other = create_survey(storage, "Outra")
+    save(storage, other, {'0': 1, '1': 'Tarde', '2': 'entrega no prazo'})
+    survey_id = create_survey(storage)
+    for answers in ANSWERS:
+        save(storage, survey_id, answers)
+
+    total, results = storage.search_answers(survey_id, "entrega", 1, 0)
+    assert total == 2 and len(results) == 1
+    _, page2 = storage.search_answers(survey_id, "entrega", 1, 1)
+    ids = {row[0] for row in results + page2}
+    assert len(ids) == 2 and ids <= {row[0] for row in storage.iter_responses(survey_id)}
+    assert all(question == 2 and "\x02" in snippet and "\x03" in snippet
+               for _, question, snippet in results + page2)
+    assert storage.search_answers(survey_id, "inexistente", 10, 0) == (0, [])
+    assert storage.search_answers(survey_id, "entrega", 10, 5) == (2, [])
+
+def test_search_ranks_most_recent_candidates(storage, monkeypatch):
+    survey_id = create_survey(storage)
+    for answers in ANSWERS:
+        save(storage, survey_id, answers)
+    monkeypatch.setattr(app, "SEARCH_RANK_CANDIDATES", 1)
+    total, results = storage.search_answers(survey_id, "entrega", 10, 0)
+    assert total == 2 and [row[0] for row in results] == [max(row[0] for row in storage.iter_responses(survey_id))]
+
+def test_outdated_sqlite_search_index_is_rebuilt(tmp_path):
+    path = str(tmp_path / "survey.db")
+    conn = app.sqlite3.connect(path)
+    conn.execute("""CREATE VIRTUAL TABLE response_text USING fts5
+                    (answer, response_id UNINDEXED, survey_id UNINDEXED, question UNINDEXED)""")
+    conn.commit()
+    conn.close()
+    storage = app.SQLiteStorage(path)
+    storage.init_schema(lambda: "hash-padrao")
+    survey_id = create_survey(storage)
+    save(storage, survey_id, ANSWERS[0])
+    assert storage.search_answers(survey_id, "entrega", 10, 0)[0] == 1
+    with storage.get_connection() as conn:
+        c = conn.cursor()
+        assert not storage._search_index_outdated(c)
+
+def test_search_index_backfill(make_storage, storage):
+    survey_id = create_survey(storage)
+    save(storage, survey_id, ANSWERS[0])
+    with storage.get_connection() as conn:
+        conn.cursor().execute("DROP TABLE response_text")
+        conn.commit()
+    rebuilt = make_storage()
+    assert rebuilt.search_answers(survey_id, "entrega", 10, 0)[0] == 1
+
+def test_interrupted_search_backfill_is_redone(make_storage, storage, monkeypatch):
+    survey_id = create_survey(storage)
+    save(storage, survey_id, ANSWERS[0])
+    save(storage, survey_id, ANSWERS[2])
+    with storage.get_connection() as conn:
+        conn.cursor().execute("DROP TABLE response_text")
+        conn.commit()
+    backfill = type(storage)._backfill_search_index
+
+    def failing_backfill(self, c):
+        backfill(self, c)
+        raise app.sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(type(storage), "_backfill_search_index", failing_backfill)
+    with pytest.raises(app.sqlite3.OperationalError):
+        make_storage()
+    assert storage.get_state('search_index_version') is None
+    monkeypatch.setattr(type(storage), "_backfill_search_index", backfill)
+    rebuilt = make_storage()
+    assert rebuilt.search_answers(survey_id, "entrega", 10, 0)[0] == 2
+    assert rebuilt.get_state('search_index_version') == app.SEARCH_INDEX_VERSION
+
+def test_more_threads_than_connections(make_storage):
+    storage = make_storage(pool_size=2)
+    survey_id = create_survey(storage)
+    errors = []
+
+    def work():
+        try:
+            for _ in range(10):
+                save(storage, survey_id, ANSWERS[1])
+                storage.survey_counts(survey_id)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert storage.survey_counts(survey_id)[0] == 80
+
+def test_write_seq_advances_once_per_counted_write(storage):
+    assert storage.write_seq() == 0
+    survey_id = create_survey(storage)
+    assert storage.write_seq() == 1
+    assert storage.save_response(survey_id, storage.encode_answers(QUESTIONS, ANSWERS[1]), True,
+                                 None, None, "sessao") == 2
+    rows = [(survey_id, storage.encode_answers(QUESTIONS, ANSWERS[1]), True, None, None, "sessao", None, [])] * 3
+    assert storage.save_responses_bulk(rows) == 3
+    assert storage.save_responses_bulk([]) is None
+    assert storage.check_rate_limit("s1", "survey_start", 1, 300) == 4
+    assert storage.check_rate_limit("s1", "survey_start", 1, 300) is None
+    storage.close_survey(survey_id)
+    assert storage.survey_counts(survey_id) == (4, 4, 4)
+    assert storage.get_totals() == (1, 4, 4)
+    assert storage.rate_limit_ages(3600)[0] == 4
+
+def test_postgres_connections_return_idle(postgres_dsn):
+    storage = app.PostgresStorage(postgres_dsn, 2)
+    try:
+        storage.init_schema(lambda: "hash-padrao")
+        storage.get_admin_credentials()
+        storage.get_totals()
+        with storage.get_connection() as conn:
+            c = conn.cursor()
+            c.execute("""
+                SELECT COUNT(*) FROM pg_stat_activity
+                WHERE datname = current_database() AND state = 'idle in transaction'
+            """)
+            assert c.fetchone()[0] == 0
+    finally:
+        storage.close()